@@ -0,0 +1,64 @@
+"""Vectorized evaluation of many Connect Four game states at once
+
+States are given as an (N, COLS, ROWS) NumPy array, indexed like the game
+state ( `states[i][col][row]` ). All 69 four-cell windows are gathered
+from every state in one operation through a precomputed (69, 4) table of
+flat cell indexes, and compared with NumPy instead of Python loops.
+
+Example:
+    states = np.array([game.simulate_moves([(col, game.player1)])
+                       for col in game.get_all_valid_cols()])
+    scores = batch.get_heuristic(states, score_table)
+"""
+import numpy as np
+
+import config
+from bitboard import ROWS, COLS, windows
+
+# Flat index ( col * ROWS + row ) of every cell in every window
+window_index = np.array([[col * ROWS + row for col, row in window] for window in windows])
+
+
+def get_windows(states):
+    """Gathers all windows of all states
+
+    Returns:
+        np.ndarray: (N, 69, 4) array with the cells of every window
+    """
+    states = np.asarray(states)
+    return states.reshape(len(states), COLS * ROWS)[:, window_index]
+
+
+def is_winner(player, states):
+    """Checks if a player has four in a row in each of the given states
+
+    Returns:
+        np.ndarray: (N,) boolean array
+    """
+    return (get_windows(states) == player).all(axis=2).any(axis=1)
+
+
+def _max_window_score(windows, table):
+    """Helper function to get the best score of any window matching a score table"""
+    keys = np.array(list(table.keys()))
+    scores = np.array(list(table.values()), dtype=float)
+    # (N, 69, K): which windows match which table entries
+    matches = (windows[:, :, None, :] == keys[None, None, :, :]).all(axis=3)
+    return np.where(matches, scores, 0).max(axis=(1, 2))
+
+
+def get_heuristic(states, score_table):
+    """Calculates the heuristic of each of the given states
+
+    Gives the same values as `ConnectFour.get_heuristic`.
+
+    Args:
+        states: (N, COLS, ROWS) array of game states
+        score_table: Window scores per player, like `connect_four.score_table`
+
+    Returns:
+        np.ndarray: (N,) array of heuristics
+    """
+    windows = get_windows(states)
+    return _max_window_score(windows, score_table[config.PLAYER1]) - \
+        _max_window_score(windows, score_table[config.PLAYER2])
@@ -0,0 +1,289 @@
+"""Bitboard representation of Connect Four positions
+
+Every player's pieces are kept as a plain int with one bit per cell. Cells
+are stored column by column, bottom to top, with one unused guard bit on top
+of every column:
+
+    bit(col, height) = col * (ROWS + 1) + height
+
+where height 0 is the bottom row ( row `ROWS - 1` in the game state ). The
+guard bits keep shifts from wrapping from one column into the next, so four
+in a row is found with two shift-and-AND operations per direction.
+"""
+import random
+
+import config
+
+ROWS = config.ROWS
+COLS = config.COLS
+STRIDE = ROWS + 1
+
+# Shift to the next cell: vertical, horizontal and the two diagonals
+shifts = (1, STRIDE, STRIDE + 1, STRIDE - 1)
+
+# The bottom cell of every column, and every cell on the board
+BOTTOM = sum(1 << (col * STRIDE) for col in range(COLS))
+FULL = BOTTOM * ((1 << ROWS) - 1)
+
+
+# Random keys for every player and cell, the Zobrist hash of a position is
+# the XOR of the keys of all its pieces
+_rng = random.Random(0)
+zobrist = {player: [_rng.getrandbits(64) for _ in range(COLS * STRIDE)]
+           for player in (config.PLAYER1, config.PLAYER2)}
+
+
+def bit(col, row):
+    """Returns the bitboard with only the cell at (col, row) set
+
+    `row` is given like in the game state, with row 0 at the top.
+    """
+    return 1 << (col * STRIDE + ROWS - 1 - row)
+
+
+def _generate_windows():
+    """Helper function to list the cells of every four-cell window
+
+    The windows are listed in the same order, and with the cells in the same
+    order, as `ConnectFour._generate_windows` yields them.
+    """
+    windows = []
+    for row in range(ROWS):
+        for col in range(COLS - 3):
+            windows.append(tuple((col + i, row) for i in range(4)))
+    for col in range(COLS):
+        for row in range(ROWS - 3):
+            windows.append(tuple((col, row + i) for i in range(4)))
+    for col in range(COLS):
+        for row in range(ROWS):
+            if col + 3 < COLS and row < ROWS - 3:
+                windows.append(tuple((col + i, row + i) for i in range(4)))
+            elif row >= 3 and col < COLS - 3:
+                windows.append(tuple((col + i, row - i) for i in range(4)))
+    return windows
+
+
+# The (col, row) cells of all 69 windows, and the same windows as bitboards
+windows = _generate_windows()
+window_bits = [tuple(bit(col, row) for col, row in window) for window in windows]
+
+# The windows through every cell, as cells and as a single bitboard per
+# window, indexed [col][row]. A new piece can only complete these windows.
+cell_windows = [[[window for window in windows if (col, row) in window]
+                 for row in range(ROWS)] for col in range(COLS)]
+cell_window_masks = [[[sum(bit(c, r) for c, r in window) for window in cell_windows[col][row]]
+                      for row in range(ROWS)] for col in range(COLS)]
+
+
+def mirror(mask):
+    """Returns the bitboard mirrored left to right"""
+    column = (1 << STRIDE) - 1
+    mirrored = 0
+    for col in range(COLS):
+        mirrored |= ((mask >> (col * STRIDE)) & column) << ((COLS - 1 - col) * STRIDE)
+    return mirrored
+
+
+def has_won(mask):
+    """Checks if a bitboard holds four in a row"""
+    for shift in shifts:
+        pairs = mask & (mask >> shift)
+        if pairs & (pairs >> (2 * shift)):
+            return True
+    return False
+
+
+def winning_cells(mask, taken):
+    """Returns every free cell that would give the bitboard four in a row
+
+    Args:
+        mask: Bitboard of the player
+        taken: Bitboard of all pieces on the board
+    """
+    # Vertical, only completed from above
+    cells = (mask << 1) & (mask << 2) & (mask << 3)
+    for shift in shifts[1:]:
+        pairs = (mask << shift) & (mask << (2 * shift))
+        cells |= pairs & (mask << (3 * shift))
+        cells |= pairs & (mask >> shift)
+        pairs = (mask >> shift) & (mask >> (2 * shift))
+        cells |= pairs & (mask >> (3 * shift))
+        cells |= pairs & (mask << shift)
+    return cells & FULL & ~taken
+
+
+def count(mask):
+    """Returns the number of cells set in a bitboard"""
+    return bin(mask).count('1')
+
+
+def build_patterns(table):
+    """Converts a score table into bitboard patterns for every window
+
+    Args:
+        table: Scores of ordered windows for one player, like
+            `score_table[player]`
+
+    Returns:
+        list: (own, empty, score) for every window and table entry, where
+            `own` must be covered by the player and `empty` must be free
+    """
+    patterns = []
+    for window in window_bits:
+        for key, score in table.items():
+            own = empty = 0
+            for cell, value in zip(window, key):
+                if value == config.BOARD:
+                    empty |= cell
+                else:
+                    own |= cell
+            patterns.append((own, empty, score))
+    return patterns
+
+
+def max_window_score(patterns, own, other):
+    """Returns the best score of any window matching a pattern
+
+    Args:
+        patterns: Patterns from `build_patterns`
+        own: Bitboard of the player the patterns are for
+        other: Bitboard of the opponent
+    """
+    taken = own | other
+    best = 0
+    for pattern, empty, score in patterns:
+        if score > best and own & pattern == pattern and not taken & empty:
+            best = score
+    return best
+
+
+class Position:
+    """A Connect Four position as one bitboard per player
+
+    `heights` holds the number of pieces in every column, which gives the
+    next free row of a column in O(1). `hash` is the Zobrist hash of the
+    position, kept up to date as pieces are played.
+    """
+    def __init__(self):
+        self.masks = {config.PLAYER1: 0, config.PLAYER2: 0}
+        self.heights = [0] * COLS
+        self.moves = 0
+        self.hash = 0
+
+    @classmethod
+    def from_state(cls, state):
+        """Creates a position from a game state, given as `game_state[col][row]`"""
+        position = cls()
+        for col in range(COLS):
+            for row in range(ROWS):
+                player = state[col][row]
+                if player != config.BOARD:
+                    position.masks[player] |= bit(col, row)
+                    position.hash ^= zobrist[player][col * STRIDE + ROWS - 1 - row]
+                    position.heights[col] = max(position.heights[col], ROWS - row)
+                    position.moves += 1
+        return position
+
+    def to_state(self):
+        """Returns the position as a game state, given as `game_state[col][row]`"""
+        state = [[config.BOARD for _ in range(ROWS)] for _ in range(COLS)]
+        for player, mask in self.masks.items():
+            for col in range(COLS):
+                for row in range(ROWS):
+                    if mask & bit(col, row):
+                        state[col][row] = player
+        return state
+
+    def copy(self):
+        """Returns an independent copy of the position"""
+        position = Position.__new__(Position)
+        position.masks = dict(self.masks)
+        position.heights = list(self.heights)
+        position.moves = self.moves
+        position.hash = self.hash
+        return position
+
+    def can_play(self, col):
+        """Checks if a column has room for another piece"""
+        return self.heights[col] < ROWS
+
+    def next_row(self, col):
+        """Returns the next free row in a column, -1 if the column is full"""
+        return ROWS - 1 - self.heights[col]
+
+    def taken(self):
+        """Returns the bitboard of all pieces on the board"""
+        return self.masks[config.PLAYER1] | self.masks[config.PLAYER2]
+
+    def playable(self):
+        """Returns the bitboard of the cells a piece can be dropped into"""
+        return (self.taken() + BOTTOM) & FULL
+
+    def valid_cols(self):
+        """Returns all columns with room for another piece"""
+        return [col for col in range(COLS) if self.heights[col] < ROWS]
+
+    def play(self, col, player):
+        """Drops a piece for the player in a column
+
+        Returns:
+            int: The row the piece landed in
+        """
+        height = self.heights[col]
+        index = col * STRIDE + height
+        self.masks[player] |= 1 << index
+        self.hash ^= zobrist[player][index]
+        self.heights[col] = height + 1
+        self.moves += 1
+        return ROWS - 1 - height
+
+    def undo(self, col, player):
+        """Takes back the last piece the player dropped in a column"""
+        height = self.heights[col] - 1
+        index = col * STRIDE + height
+        self.masks[player] ^= 1 << index
+        self.hash ^= zobrist[player][index]
+        self.heights[col] = height
+        self.moves -= 1
+
+    def key(self):
+        """Returns a number that is unique for every position
+
+        The pieces of player 1, plus one bit on top of every column.
+        """
+        return self.masks[config.PLAYER1] + self.taken() + BOTTOM
+
+    def canonical_key(self):
+        """Returns the key shared by the position and its mirror image
+
+        Returns:
+            int: The smallest of the two keys
+            bool: True if the key is the key of the mirror image
+        """
+        key = self.key()
+        mirrored = mirror(key)
+        if mirrored < key:
+            return mirrored, True
+        return key, False
+
+    def is_winner(self, player):
+        """Checks if the player has four in a row"""
+        return has_won(self.masks[player])
+
+    def is_winner_at(self, player, col):
+        """Checks if the top piece of a column gives the player four in a row
+
+        Only the windows through that piece are checked, which is enough
+        right after the piece was played.
+        """
+        if not self.heights[col]:
+            return False
+        mask = self.masks[player]
+        for window in cell_window_masks[col][ROWS - self.heights[col]]:
+            if mask & window == window:
+                return True
+        return False
+
+    def is_full(self):
+        """Checks if there is no room left on the board"""
+        return self.moves == ROWS * COLS
@@ -0,0 +1,182 @@
+"""Opening book for the built-in Connect Four player
+
+The book is a file of fixed-size records sorted by position key, read
+through `mmap`. A lookup is a binary search over the mapped file, so opening
+the book reads nothing up front and only a handful of pages are touched per
+lookup. Positions are stored under their canonical key ( see
+`Position.canonical_key` ), which folds every position together with its
+mirror image.
+
+    header: magic, version, number of records
+    record: position key, best column, score for the player to move
+
+The book is built offline by searching every position up to a given number
+of pieces with the engine:
+
+    $ python book.py --plies 6 --depth 12 --output opening_book.bin
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+import config
+from bitboard import COLS, Position
+from search import Search
+
+MAGIC = b'C4BK'
+VERSION = 1
+
+# magic, version, number of records
+HEADER = struct.Struct('<4sBI')
+# key, column, score
+RECORD = struct.Struct('<QBh')
+
+default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), config.OPENING_BOOK)
+
+
+class OpeningBook:
+    """Read-only opening book backed by a memory-mapped file"""
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.size = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+        if magic != MAGIC:
+            raise ValueError(f'\'{path}\' is not an opening book')
+        if version != VERSION:
+            raise ValueError(f'Unsupported opening book version {version}')
+
+    def __len__(self):
+        return self.size
+
+    def _key_at(self, i):
+        """Helper function to read the key of the i-th record"""
+        return RECORD.unpack_from(self.data, HEADER.size + i * RECORD.size)[0]
+
+    def lookup(self, position):
+        """Looks up the best move in a position
+
+        Returns:
+            tuple: (column, score), None if the position is not in the book
+        """
+        key, mirrored = position.canonical_key()
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.size:
+            return None
+
+        found, col, score = RECORD.unpack_from(self.data, HEADER.size + low * RECORD.size)
+        if found != key:
+            return None
+        return (COLS - 1 - col if mirrored else col), score
+
+    def close(self):
+        """Unmaps and closes the book file"""
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_book(path, entries):
+    """Writes an opening book file
+
+    Args:
+        path: File to write
+        entries: Dict mapping canonical position keys to (column, score)
+    """
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for key in sorted(entries):
+            col, score = entries[key]
+            f.write(RECORD.pack(key, col, score))
+
+
+def generate_positions(plies):
+    """Yields every position with at most `plies` pieces, one per mirror pair
+
+    Positions that are already won, or full, are left out. Player 1 moves
+    first.
+
+    Yields:
+        tuple: (canonical key, mirrored, position, player to move)
+    """
+    seen = set()
+    layer = [Position()]
+    for moves in range(plies + 1):
+        player = config.PLAYER1 if moves % 2 == 0 else config.PLAYER2
+        next_layer = []
+        for position in layer:
+            key, mirrored = position.canonical_key()
+            if key in seen:
+                continue
+            seen.add(key)
+            yield key, mirrored, position, player
+
+            for col in position.valid_cols():
+                child = position.copy()
+                child.play(col, player)
+                if not child.is_winner_at(player, col) and not child.is_full():
+                    next_layer.append(child)
+        layer = next_layer
+
+
+def build_book(plies, depth=None, time_budget=None, verbose=False):
+    """Searches every position with at most `plies` pieces
+
+    Args:
+        plies: Maximum number of pieces on the board
+        depth: Search depth per position, None for no limit
+        time_budget: Seconds to search per position, None for no limit
+
+    Returns:
+        dict: Canonical position keys mapped to (column, score)
+    """
+    search = Search(depth, time_budget)
+    entries = {}
+    start = time.perf_counter()
+    for key, mirrored, position, player in generate_positions(plies):
+        col = search.best_move(position, player)
+        if search.score is None:
+            # Not even the first depth finished in time
+            continue
+        entries[key] = (COLS - 1 - col if mirrored else col), search.score
+        if verbose and len(entries) % 100 == 0:
+            print(f'{len(entries)} positions, {time.perf_counter() - start:.1f}s',
+                  file=sys.stderr)
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a Connect Four opening book')
+    parser.add_argument('--plies', type=int, default=4,
+                        help='Maximum number of pieces on the board')
+    parser.add_argument('--depth', type=int, default=None, help='Search depth per position')
+    parser.add_argument('--time', type=float, default=None,
+                        help='Seconds to search per position')
+    parser.add_argument('--output', default=default_path, help='File to write')
+    args = parser.parse_args(argv)
+    if args.depth is None and args.time is None:
+        parser.error('Give a --depth, a --time or both')
+
+    entries = build_book(args.plies, args.depth, args.time, verbose=True)
+    write_book(args.output, entries)
+    print(f'Wrote {len(entries)} positions to {os.path.abspath(args.output)}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
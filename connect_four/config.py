@@ -2,7 +2,12 @@ BOARD   =  0
 PLAYER1 = 1
 PLAYER2 = 2
 
+ROWS = 6
+COLS = 7
+
 DIFFICULTY = 'medium' # easy, medium, hard
+OPENING_BOOK = 'opening_book.bin' # Built with book.py, not used if missing
+SEARCH_WORKERS = 1 # Processes searching for the built-in player, None for all cores
 
 # Not yet implemented
 # WIN_SEQUENCE = 4 # How many pieces to connect in order to win
@@ -1,19 +1,23 @@
-from copy import deepcopy
 import os
 import numpy as np
 import time
 import random
 import pygame
-pygame.init()
 
 import config
+import batch
+import bitboard
+from bitboard import Position
+from search import Search
+from parallel import ParallelSearch
+import book
 
 CLOCK_SPEED = 10
 WIDTH  = 589
 HEIGHT = 540
 PIECE_SIZE = 63 # Hardcoded to fit with background
-ROWS = 6
-COLS = 7
+ROWS = config.ROWS
+COLS = config.COLS
 
 colors = {
     'black': (0, 0, 0),
@@ -34,37 +38,15 @@ score_table = {
     }
 }
 
-difficulty = {'easy': 3, 'medium': 5, 'hard': 7}
+# The score table as bitboard patterns over all windows
+score_patterns = {player: bitboard.build_patterns(table)
+                  for player, table in score_table.items()}
 
-gfx_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gfx')
-
-
-class Node:
-    def __init__(self, move, parent=None):
-        self.move = move
-        self.parent = parent
-        self.score = 0
-        if not parent:
-            self.depth = 1
-            self.is_opponent = False
-        else:
-            self.depth = parent.depth + 1
-            self.is_opponent = not parent.is_opponent
-
-    def move_list(self):
-        moves = []
-        node = self
-        while node:
-            moves.append((node.move, 1 if node.is_opponent else 2))
-            node = node.parent
-        moves.reverse()
-        return moves
+# Maximum search depth ( None for no limit ), seconds to search per move and
+# whether to play the first moves from the opening book
+difficulty = {'easy': (2, 0.5, False), 'medium': (5, 1.0, True), 'hard': (None, 2.0, True)}
 
-    def root_move(self):
-        node = self
-        while node.parent:
-            node = node.parent
-        return node.move
+gfx_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gfx')
 
 
 class Highlighter(pygame.sprite.Sprite):
@@ -121,6 +103,16 @@ class TestPiece(BasePiece):
 
 class ConnectFour():
     def __init__(self):
+        self.max_depth, self.time_budget, use_book = \
+            difficulty.get(config.DIFFICULTY, difficulty['easy'])
+        if config.SEARCH_WORKERS == 1:
+            self.search = Search(self.max_depth, self.time_budget)
+        else:
+            # The worker processes are started before pygame is initialized
+            self.search = ParallelSearch(self.max_depth, self.time_budget,
+                                         workers=config.SEARCH_WORKERS)
+        pygame.init()
+
         self.font_style = pygame.font.SysFont(None, 80)
         self.width   = WIDTH
         self.height  = HEIGHT
@@ -137,8 +129,10 @@ class ConnectFour():
         self.player1 = 1
         self.player2 = 2
         self.game_state = [[self.board_piece for _ in range(ROWS)] for _ in range(COLS)]
+        self.position = Position()
 
-        self.max_depth = difficulty.get(config.DIFFICULTY, 'easy')
+        self.book = book.OpeningBook(book.default_path) \
+            if use_book and os.path.exists(book.default_path) else None
         self.ai = lambda placeholder: self._game_over(msg='No AI registered!')
 
 
@@ -174,6 +168,9 @@ class ConnectFour():
 
     def _exit(self):
         """Helper function to exit the game"""
+        self.search.close()
+        if self.book is not None:
+            self.book.close()
         pygame.quit()
         quit()
 
@@ -213,37 +210,34 @@ class ConnectFour():
     def _get_next_row(self, col, state=None):
         """Helper function to get the next free row in a given column and state"""
         if not state:
-            state = self.game_state
+            return self.position.next_row(col)
         return next((i - 1 for i, r in enumerate(state[col]) 
                      if r != self.board_piece), # Condition
                      ROWS - 1) # Default return value
 
 
     def _put_piece(self, player, col, row, state=None):
-        """Helper function to insert player pieces on the board"""
+        """Helper function to insert player pieces on the board
+
+        Sprites are only created for pieces put on the real board.
+        """
         if not state:
             state = self.game_state
-        
-        if player == self.player1:
-            piece = RedPiece(col, row)
-        elif player == self.player2:
-            piece = YellowPiece(col, row)
-        else:
+
+        if player not in (self.player1, self.player2):
             raise Exception(f'Unknown player \'{player}\'')
 
         state[col][row] = player
-        
+
         if state is self.game_state:
+            piece = RedPiece(col, row) if player == self.player1 else YellowPiece(col, row)
             self.game_pieces.append(piece)
+            self.position.play(col, player)
 
     def _valid_cols(self, state=None):
         """Helper function to find valid cols with open rows given a state"""
-        if not state:
-            state = self.game_state
-        for col in range(COLS):
-            row = self._get_next_row(col, state=state)
-            if row > -1:
-                yield col
+        position = self.position if not state else Position.from_state(state)
+        yield from position.valid_cols()
 
 
     def _get_score(self, player, window):
@@ -255,61 +249,11 @@ class ConnectFour():
 
     def _make_move(self):
         """Game AI"""
-        def generate_children(parent_node, current_state):
-            children = []
-            for col in self._valid_cols(state=current_state):
-                child = Node(col, parent=parent_node)
-                child_state = self.simulate_moves(child.move_list())
-                for window in self._generate_windows(state=child_state):
-                    ## Check if child wins - break if
-                    winner = self._check_winning_window(window)
-                    if winner and winner == self.player1:
-                        parent_node.score = -1
-                        return None
-                    elif winner and winner == self.player2:
-                        raise Exception('Player won on game move - should not happen. Please report bug')
-                    
-                    ## Calculate child score
-                    child.score = max(child.score, score_table[self.player1].get(tuple(window), 0))
-            
-                children.append(child)
-            return max(children, key=lambda x: x.score)
-
-        open_list = []
-        # Populate open_list with root nodes
-        for col in self._valid_cols():
-            open_list.append(Node(col))
-
-        best_node = open_list[0]
-        while open_list:
-            node = open_list.pop(0)
-            moves = node.move_list()
-            new_state = self.simulate_moves(moves)
-            
-            if node.is_opponent:
-                for col in self._valid_cols(state=new_state):
-                    open_list.append(Node(col, parent=node))
-            else:
-                for window in self._generate_windows(state=new_state):
-                    winner = self._check_winning_window(window)
-                    if winner and winner == self.player2:
-                        # We assume any prev. opponent move is their best
-                        return node.root_move()
-                    elif winner and winner == self.player1:
-                        raise Exception('Player won on game move - should not happen. Please report bug')
-                    
-                    node.score = max(node.score, score_table[self.player2].get(tuple(window), 0))
-                        
-                # Create opponent children
-                if node.depth < self.max_depth:
-                    child = generate_children(node, new_state)
-                
-                    if child:
-                        open_list.append(child)
-                if node.score > best_node.score:
-                    best_node = node
-
-        return best_node.root_move()
+        if self.book:
+            entry = self.book.lookup(self.position)
+            if entry and self.position.can_play(entry[0]):
+                return entry[0]
+        return self.search.best_move(self.position, self.player2)
 
 
     def _check_if_col_is_full(self, col):
@@ -373,23 +317,29 @@ class ConnectFour():
     def _check_if_board_is_full(self, state=None):
         """Helper function to check if the board is full"""
         if not state:
-            state = self.game_state
+            return self.position.is_full()
         for col in state:
             if 0 in col:
                 return False
         return True
 
-    def _check_if_winner(self):
-        """Helper function for the game to know if there is a winner"""
-        for window in self._generate_windows():
-            winner = self._check_winning_window(window)
-            if winner:
-                if winner == self.player1:
-                    self._game_won()
-                elif winner == self.player2:
-                    self._game_over()
-                else:
-                    raise Exception(f'Unknown winner \'{winner}\'')
+    def _check_if_winner(self, col=None):
+        """Helper function for the game to know if there is a winner
+
+        Given the column of the last move, only the windows through the last
+        piece are checked.
+        """
+        if col is None:
+            player1_won = self.position.is_winner(self.player1)
+            player2_won = self.position.is_winner(self.player2)
+        else:
+            player1_won = self.position.is_winner_at(self.player1, col)
+            player2_won = self.position.is_winner_at(self.player2, col)
+
+        if player1_won:
+            self._game_won()
+        elif player2_won:
+            self._game_over()
         if self._check_if_board_is_full():
             self._game_over('Draw!')
 
@@ -415,12 +365,13 @@ class ConnectFour():
             A copy of the resulting game state if all moves are legal
             False if any move is illegal
         """
-        new_state = deepcopy(self.game_state)
+        new_state = [list(col) for col in self.game_state]
+        heights = list(self.position.heights)
         for col, player in moves:
-            row = self._get_next_row(col, state=new_state)
-            if row == -1:
+            if heights[col] == ROWS:
                 return False
-            self._put_piece(player, col, row, new_state)
+            heights[col] += 1
+            new_state[col][ROWS - heights[col]] = player
         return new_state
     
 
@@ -435,22 +386,34 @@ class ConnectFour():
         Returns:
             list: A list of all available columns
         """
-        return [col for col in self._valid_cols(state=state)]
+        position = self.position if state is None else Position.from_state(state)
+        return position.valid_cols()
 
 
-    def is_winner(self, player, state):
+    def is_winner(self, player, state, last_move=None):
         """Checks if a given player wins the game in a given game state
 
+        If the state had no winner before the last move, give the column of
+        the last move as `last_move`. Only the windows through the last piece
+        are then checked, which is a lot faster.
+
         Args:
             player: The player to check win condition for
             state: A copy of the game state
+            last_move: Optional column of the last move played in the state
 
         Returns:
             bool: True if the player wins, else False
         """
-        for window in self._generate_windows(state=state):
-            winner = self._check_winning_window(window)
-            if winner == player:
+        if last_move is None:
+            return Position.from_state(state).is_winner(player)
+
+        column = state[last_move]
+        row = next((i for i, r in enumerate(column) if r != self.board_piece), None)
+        if row is None or column[row] != player:
+            return False
+        for window in bitboard.cell_windows[last_move][row]:
+            if all(state[col][r] == player for col, r in window):
                 return True
         return False
 
@@ -464,16 +427,44 @@ class ConnectFour():
         Returns:
             float: Heuristic of the given state
         """
-        player_1_max = max([self._get_score(self.player1, window)
-                            for window in self._generate_windows(state=state)])
+        position = Position.from_state(state)
+        player_1_max = bitboard.max_window_score(score_patterns[self.player1],
+                                                 position.masks[self.player1],
+                                                 position.masks[self.player2])
 
-        player_2_max = max([self._get_score(self.player2, window)
-                            for window in self._generate_windows(state=state)])
+        player_2_max = bitboard.max_window_score(score_patterns[self.player2],
+                                                 position.masks[self.player2],
+                                                 position.masks[self.player1])
 
         h = player_1_max - player_2_max
         return h
 
 
+    def is_winner_batch(self, player, states):
+        """Checks if a given player wins the game in each of many game states
+
+        Args:
+            player: The player to check win condition for
+            states: NumPy array of N game states, with shape (N, 7, 6)
+
+        Returns:
+            np.ndarray: N booleans, True where the player wins
+        """
+        return batch.is_winner(player, states)
+
+
+    def get_heuristic_batch(self, states):
+        """Calculate the heuristic of each of many game states
+
+        Args:
+            states: NumPy array of N game states, with shape (N, 7, 6)
+
+        Returns:
+            np.ndarray: N heuristics, the same as `get_heuristic` gives
+        """
+        return batch.get_heuristic(states, score_table)
+
+
     def start(self, use_ai=False):
         self._update_display()
         # Game Loop
@@ -506,7 +497,7 @@ class ConnectFour():
                 self._put_piece(self.player1, move, row)
         
             self._update_display()
-            self._check_if_winner()
+            self._check_if_winner(move)
             
             # Game AI moves after player
             move = self._make_move()
@@ -515,7 +506,7 @@ class ConnectFour():
                 self._put_piece(self.player2, move, row)
 
             self._update_display()
-            self._check_if_winner()
+            self._check_if_winner(move)
 
             # None of the above! Let's continue!
             self.clock.tick(CLOCK_SPEED)
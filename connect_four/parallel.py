@@ -0,0 +1,379 @@
+"""Multi-core search for the built-in Connect Four player
+
+`ParallelSearch` splits the search in the style of Young Brothers Wait: at
+any node with enough plies left, the first move ( the best move stored for
+the position ) is searched on its own, which gives the score the other moves
+have to beat. The other moves are then searched at the same time, each with
+that score as its bound. Each of them is split the same way while some
+workers are idle, else it is searched whole by a worker process. As the
+first move is usually the best, this prunes nearly as much as searching the
+moves one after the other, and a move that beats the bound of its node cuts
+the node off without waiting for the others.
+
+The main process only walks the split nodes. It runs each of them as a
+generator ( see `_split` ), which yields the moves to score and is sent back
+their scores, so any number of nodes can wait for the workers at once.
+
+A move only beats the first move if it scores above the bound, and then its
+score is exact, so the result is the same as that of `Search` no matter how
+the work is spread over the workers.
+
+All processes share one transposition table in shared memory, so a worker
+finds the positions searched by the others, as a single search would.
+
+If a worker dies, the search goes on in the main process alone.
+
+The workers are started with `spawn` by default, which starts a new
+interpreter that imports the main module again. The script that starts the
+game has to guard it with `if __name__ == '__main__':`, else every worker
+starts a game of its own.
+
+Compare the search against `Search` with:
+
+    $ python parallel.py --depth 10 --workers 6
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+import bitboard
+from bitboard import Position
+from search import Search, SearchTimeout, WIN_SCORE, move_order, opponent
+from transposition import SharedTranspositionTable, EXACT, LOWER, UPPER
+
+# Search of the worker process, sharing the table of the main process
+_worker_search = None
+
+
+def _start_worker(words):
+    """Creates the search of a worker process, on the given shared table"""
+    global _worker_search
+    _worker_search = Search(table=SharedTranspositionTable(words=words))
+
+
+def _search_task(position, player, depth, alpha, beta, deadline, generation):
+    """Scores a position for the player to move, in a worker process
+
+    The deadline is given as `time.time()`, which unlike `time.perf_counter()`
+    is the same in every process.
+
+    Returns:
+        int: The score, None if the time budget ran out
+        int: Number of nodes searched
+    """
+    search = _worker_search
+    search.table.generation = generation
+    search.nodes = 0
+    search.deadline = None if deadline is None else \
+        time.perf_counter() + deadline - time.time()
+    try:
+        score = search._negamax(position, player, depth, alpha, beta)
+    except SearchTimeout:
+        return None, search.nodes
+    return score, search.nodes
+
+
+class _SplitNode:
+    """A split node of the search, waiting for the scores of its moves
+
+    Args:
+        split: The generator running the node, see `ParallelSearch._split`
+        parent: The node waiting for this one, None for the root
+        slot: Index of this node among the moves of its parent
+    """
+    def __init__(self, split, parent=None, slot=None):
+        self.split = split
+        self.parent = parent
+        self.slot = slot
+        self.scores = None
+        self.beta = None
+        # Slot of every move still being scored, and its node or future
+        self.jobs = {}
+        self.dropped = False
+
+    def start(self, jobs, beta, ready, running):
+        """Starts waiting for the moves the node yielded"""
+        self.scores = [None] * len(jobs)
+        self.beta = beta
+        self.jobs = {}
+        for slot, job in enumerate(jobs):
+            if isinstance(job, Future):
+                self.jobs[slot] = job
+                running[job] = (self, slot)
+            elif isinstance(job, int):
+                self.scores[slot] = -job
+            else:
+                self.jobs[slot] = _SplitNode(job, self, slot)
+                ready.append(self.jobs[slot])
+        if not self.jobs or any(score is not None and score >= beta for score in self.scores):
+            self.drop_jobs(running)
+            ready.append(self)
+
+    def deliver(self, slot, score, ready, running):
+        """Takes the score of a move, given for the player to move after it"""
+        self.scores[slot] = -score
+        del self.jobs[slot]
+        if -score >= self.beta:
+            # The other moves can not change the result
+            self.drop_jobs(running)
+        if not self.jobs:
+            ready.append(self)
+
+    def drop_jobs(self, running):
+        """Stops waiting for the moves still being scored"""
+        for job in self.jobs.values():
+            if isinstance(job, Future):
+                running.pop(job, None)
+                job.cancel()
+            else:
+                job.dropped = True
+                job.drop_jobs(running)
+        self.jobs = {}
+
+
+class ParallelSearch(Search):
+    """Iterative deepening alpha-beta search spread over a pool of processes
+
+    The workers are started when the search is created. Create the search
+    before `pygame.init()` if another start method than `spawn` is used,
+    since a forked worker must not inherit a running display.
+
+    Args:
+        max_depth: Maximum number of plies to search, None for no limit
+        time_budget: Seconds to search per move, None for no limit
+        workers: Number of processes, defaults to the number of cores
+        start_method: How to start the workers, see `multiprocessing.get_context`
+    """
+    # Positions with fewer plies left are searched whole by one worker, and
+    # shallower iterations here, as they are quicker to search than to split
+    min_parallel_depth = 6
+
+    def __init__(self, max_depth=None, time_budget=None, workers=None, start_method='spawn'):
+        super().__init__(max_depth, time_budget, SharedTranspositionTable())
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                        mp_context=multiprocessing.get_context(start_method),
+                                        initializer=_start_worker, initargs=(self.table.words,))
+        self.task_deadline = None
+        # Future of every worker task, and the node waiting for it
+        self.running = {}
+        # Start every worker now, so the first search does not pay for it
+        wait([self.pool.submit(time.sleep, 0) for _ in range(self.workers)])
+
+    def _remaining(self):
+        """Helper function to get the seconds left of the time budget"""
+        if self.deadline is None:
+            return None
+        remaining = self.deadline - time.perf_counter()
+        if remaining <= 0:
+            raise SearchTimeout()
+        return remaining
+
+    def _probe(self, position, player, depth, alpha, beta):
+        """Helper function to score a position without searching it, if `_negamax` would
+
+        Returns:
+            int: The score, None if the position has to be searched
+        """
+        own = position.masks[player]
+        if bitboard.winning_cells(own, position.taken()) & position.playable():
+            return WIN_SCORE - position.moves - 1
+        entry = self.table.get(position.hash)
+        if entry is None or entry[0] < depth:
+            return None
+        stored_depth, bound, score, move = entry
+        if bound == EXACT or bound == LOWER and score >= beta or bound == UPPER and score <= alpha:
+            return score
+        return None
+
+    def _job(self, position, player, col, depth, alpha, beta):
+        """Helper function to start scoring a move, for the player to move after it
+
+        Returns:
+            The score if it is known without searching, else a node to split if
+            enough plies are left, else the future of a worker task
+        """
+        position = position.copy()
+        position.play(col, player)
+        if position.is_winner_at(player, col):
+            return -(WIN_SCORE - position.moves)
+        if position.is_full():
+            return 0
+        other = opponent(player)
+        score = self._probe(position, other, depth - 1, -beta, -alpha)
+        if score is not None:
+            return score
+        if depth - 1 >= self.min_parallel_depth and len(self.running) < self.workers:
+            return self._child(position, other, depth - 1, -beta, -alpha)
+        return self.pool.submit(_search_task, position, other, depth - 1, -beta, -alpha,
+                                self.task_deadline, self.table.generation)
+
+    def _child(self, position, player, depth, alpha, beta):
+        """Helper function to split a node below the root, giving only its score"""
+        return (yield from self._split(position, player, depth, alpha, beta))[1]
+
+    def _split(self, position, player, depth, alpha, beta, order=None):
+        """Helper function to score a position, searching all but its first move in parallel
+
+        Runs as a generator under `_run`. It yields the moves to score, with
+        the score that cuts the node off, and is sent back their scores.
+
+        Returns:
+            int: The best column
+            int: The score of the position
+        """
+        self.nodes += 1
+        if order is None:
+            order = [col for col in move_order if position.can_play(col)]
+            entry = self.table.get(position.hash)
+            if entry is not None and entry[3] in order:
+                order.remove(entry[3])
+                order.insert(0, entry[3])
+
+        original_alpha = alpha
+        best_col = order[0]
+        best, = yield [self._job(position, player, best_col, depth, alpha, beta)], beta
+        alpha = max(alpha, best)
+        if alpha < beta and len(order) > 1:
+            # The other moves only have to be searched for beating the first
+            scores = yield [self._job(position, player, col, depth, alpha, beta)
+                            for col in order[1:]], beta
+            # Ties go to the earlier move, moves left unsearched after a cutoff score None
+            for col, score in zip(order[1:], scores):
+                if score is not None and score > best:
+                    best_col, best = col, score
+
+        if best <= original_alpha:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(position.hash, depth, bound, best, best_col)
+        return best_col, best
+
+    def _run(self, split):
+        """Helper function to run a split node, and every node and task it waits for
+
+        Returns:
+            The result of the node
+        """
+        self.running = running = {}
+        ready = [_SplitNode(split)]
+        try:
+            while True:
+                while ready:
+                    node = ready.pop()
+                    if node.dropped:
+                        continue
+                    try:
+                        jobs, beta = node.split.send(node.scores)
+                    except StopIteration as stop:
+                        if node.parent is None:
+                            return stop.value
+                        node.parent.deliver(node.slot, stop.value, ready, running)
+                        continue
+                    node.start(jobs, beta, ready, running)
+
+                remaining = self._remaining()
+                done, _ = wait(running, timeout=None if remaining is None else remaining + 0.05,
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    raise SearchTimeout()
+                for future in done:
+                    if future not in running:
+                        # Dropped by a cutoff earlier in this loop
+                        continue
+                    node, slot = running.pop(future)
+                    score, nodes = future.result()
+                    self.nodes += nodes
+                    if score is None:
+                        raise SearchTimeout()
+                    node.deliver(slot, score, ready, running)
+        finally:
+            for future in running:
+                future.cancel()
+
+    def _search_root(self, position, player, depth, order):
+        """Helper function to find the best move and its score at a given depth"""
+        if self.pool is None or depth < self.min_parallel_depth:
+            return super()._search_root(position, player, depth, order)
+        remaining = self._remaining()
+        self.task_deadline = None if remaining is None else time.time() + remaining
+        try:
+            return self._run(self._split(position, player, depth,
+                                         -WIN_SCORE - 1, WIN_SCORE + 1, list(order)))
+        except BrokenProcessPool:
+            # A worker died, search on in this process alone
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+            return super()._search_root(position, player, depth, order)
+
+    def close(self):
+        """Shuts down the worker processes"""
+        if self.pool is not None:
+            # Running tasks stop at their deadline
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+
+def random_positions(count, moves, seed=0):
+    """Helper function to play random games up to a number of pieces
+
+    Returns:
+        list: (position, player to move) for every game that is still open
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position, player = Position(), config.PLAYER1
+        for _ in range(moves):
+            col = rng.choice(position.valid_cols())
+            position.play(col, player)
+            if position.is_winner_at(player, col):
+                break
+            player = opponent(player)
+        else:
+            positions.append((position, player))
+    return positions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare ParallelSearch against Search')
+    parser.add_argument('--depth', type=int, default=9, help='Search depth per position')
+    parser.add_argument('--positions', type=int, default=10, help='Number of positions')
+    parser.add_argument('--moves', type=int, default=6, help='Pieces on every position')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes')
+    args = parser.parse_args(argv)
+
+    positions = random_positions(args.positions, args.moves)
+    searches = {'Search': Search(args.depth),
+                'ParallelSearch': ParallelSearch(args.depth, workers=args.workers)}
+    # Start the workers before timing anything
+    searches['ParallelSearch'].best_move(*random_positions(1, args.moves, seed=1)[0])
+
+    results = {}
+    for name, search in searches.items():
+        start = time.perf_counter()
+        nodes = 0
+        moves = []
+        for position, player in positions:
+            # Every position is searched from an empty table
+            search.table.clear()
+            moves.append((search.best_move(position, player), search.score))
+            nodes += search.nodes
+        results[name] = moves
+        print(f'{name:>14}: {time.perf_counter() - start:7.2f}s {nodes:>10} nodes')
+        search.close()
+
+    if results['Search'] != results['ParallelSearch']:
+        print('The searches disagree:', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,15 @@
 from connect_four import ConnectFour
 
-game = ConnectFour()
 
-@game.register_ai
-def super_ai():
-    import random
-    import time
-    time.sleep(0.5)
-    return random.randint(0, 6)
+# The guard keeps worker processes of the search from starting a game
+if __name__ == '__main__':
+    game = ConnectFour()
 
-game.start(use_ai=True)
\ No newline at end of file
+    @game.register_ai
+    def super_ai():
+        import random
+        import time
+        time.sleep(0.5)
+        return random.randint(0, 6)
+
+    game.start(use_ai=True)
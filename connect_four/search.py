@@ -0,0 +1,189 @@
+"""Alpha-beta search for the built-in Connect Four player
+
+The search is a negamax with alpha-beta pruning over bitboard positions.
+It deepens one ply at a time until the depth limit is reached or the time
+budget runs out, and plays the best move of the deepest finished search.
+Moves are tried center-first, after the best move stored for the position
+in the transposition table. The table is kept between moves, so positions
+searched on an earlier turn are not searched again from nothing.
+
+The search plays and takes back moves on a single copy of the position,
+so no position is ever copied or rebuilt while searching.
+
+Scores are given for the player to move. A win scores `WIN_SCORE` less the
+number of pieces on the board, so quicker wins score higher. Other leaves
+are scored by `evaluate`.
+"""
+import time
+
+import config
+import bitboard
+from bitboard import COLS, ROWS
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+WIN_SCORE = 1000
+
+# Columns ordered center first
+move_order = sorted(range(COLS), key=lambda col: abs(col - COLS // 2))
+center = sum(bitboard.bit(COLS // 2, row) for row in range(ROWS))
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget has run out"""
+
+
+def opponent(player):
+    """Returns the other player"""
+    return config.PLAYER2 if player == config.PLAYER1 else config.PLAYER1
+
+
+def evaluate(position, player):
+    """Scores a position for the given player, without searching
+
+    Counts the free cells that would complete four in a row for each player,
+    and the pieces in the center column.
+    """
+    own = position.masks[player]
+    other = position.masks[opponent(player)]
+    taken = own | other
+    threats = bitboard.count(bitboard.winning_cells(own, taken)) - \
+        bitboard.count(bitboard.winning_cells(other, taken))
+    return 4 * threats + bitboard.count(own & center) - bitboard.count(other & center)
+
+
+class Search:
+    """Iterative deepening alpha-beta search
+
+    Args:
+        max_depth: Maximum number of plies to search, None for no limit
+        time_budget: Seconds to search per move, None for no limit
+        table: Transposition table to use, a new one by default
+    """
+    def __init__(self, max_depth=None, time_budget=None, table=None):
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.table = table if table is not None else TranspositionTable()
+        self.deadline = None
+        self.nodes = 0
+        self.depth = 0
+        self.score = None
+
+    def _check_time(self):
+        """Helper function to stop the search once the time budget has run out"""
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def _negamax(self, position, player, depth, alpha, beta):
+        """Helper function to score a position for the player to move"""
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_time()
+
+        own = position.masks[player]
+        playable = position.playable()
+        if bitboard.winning_cells(own, position.taken()) & playable:
+            return WIN_SCORE - position.moves - 1
+        if not playable:
+            return 0
+        if depth == 0:
+            return evaluate(position, player)
+
+        original_alpha = alpha
+        order = move_order
+        entry = self.table.get(position.hash)
+        if entry is not None:
+            stored_depth, bound, score, move = entry
+            if stored_depth >= depth:
+                if bound == EXACT:
+                    return score
+                if bound == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+            order = (move,) + tuple(col for col in move_order if col != move)
+
+        best, best_col = -WIN_SCORE, None
+        for col in order:
+            if not position.can_play(col):
+                continue
+            position.play(col, player)
+            score = -self._negamax(position, opponent(player), depth - 1, -beta, -alpha)
+            position.undo(col, player)
+            if score > best:
+                best, best_col = score, col
+                if best > alpha:
+                    alpha = best
+                    if alpha >= beta:
+                        break
+
+        if best <= original_alpha:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(position.hash, depth, bound, best, best_col)
+        return best
+
+    def _search_root(self, position, player, depth, order):
+        """Helper function to find the best move and its score at a given depth"""
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        best_col, best = order[0], -WIN_SCORE - 1
+        for col in order:
+            position.play(col, player)
+            if position.is_winner_at(player, col):
+                score = WIN_SCORE - position.moves
+            elif position.is_full():
+                score = 0
+            else:
+                score = -self._negamax(position, opponent(player), depth - 1, -beta, -alpha)
+            position.undo(col, player)
+            if score > best:
+                best_col, best = col, score
+                alpha = max(alpha, best)
+        return best_col, best
+
+    def best_move(self, position, player):
+        """Finds the best column for the player to drop a piece in
+
+        Args:
+            position: The position to search from, with at least one free column
+            player: The player to move
+
+        Returns:
+            int: The column to play
+        """
+        start = time.perf_counter()
+        self.deadline = None if self.time_budget is None else start + self.time_budget
+        self.nodes = 0
+        self.depth = 0
+        self.score = None
+        self.table.new_search()
+        # A timeout leaves the searched position half played, so search a copy
+        position = position.copy()
+
+        order = [col for col in move_order if position.can_play(col)]
+        best_col = order[0]
+        max_depth = ROWS * COLS - position.moves
+        if self.max_depth is not None:
+            max_depth = min(max_depth, self.max_depth)
+
+        for depth in range(1, max_depth + 1):
+            try:
+                best_col, score = self._search_root(position, player, depth, order)
+            except SearchTimeout:
+                break
+            self.depth = depth
+            self.score = score
+            # Search the best move first at the next depth
+            order.remove(best_col)
+            order.insert(0, best_col)
+            if abs(score) >= WIN_SCORE - ROWS * COLS:
+                # Forced win or loss found, searching deeper will not change it
+                break
+        return best_col
+
+    def close(self):
+        """Releases anything held by the search, nothing for a single process"""
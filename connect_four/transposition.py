@@ -0,0 +1,122 @@
+"""Fixed-size transposition table for the Connect Four search
+
+Positions are stored by their Zobrist hash in a table with a fixed number
+of slots, so memory use is bounded no matter how long the search runs. Each
+slot holds the full hash, the depth searched, the bound type of the score,
+the score and the best move found.
+
+When two positions share a slot, the entry from the deeper search is kept,
+unless it was stored during an earlier search ( an earlier move of the
+game ), in which case it is always replaced.
+
+`SharedTranspositionTable` keeps the same table in shared memory, so the
+processes of a parallel search all store into and look up the same table.
+"""
+import ctypes
+import multiprocessing
+
+EXACT = 0
+LOWER = 1  # The score is at least this good ( the search failed high )
+UPPER = 2  # The score is at most this good ( the search failed low )
+
+
+class TranspositionTable:
+    """Transposition table with `2 ** bits` slots
+
+    Args:
+        bits: Number of hash bits used to pick a slot
+    """
+    def __init__(self, bits=18):
+        self.size = 1 << bits
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.generation = 0
+
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """Marks all stored entries as belonging to an earlier search"""
+        self.generation += 1
+
+    def get(self, key):
+        """Looks up a position by its hash
+
+        Returns:
+            tuple: (depth, bound, score, move), None if the position is not stored
+        """
+        entry = self.entries[key & self.mask]
+        if entry is None or entry[0] != key:
+            return None
+        self.hits += 1
+        return entry[1:5]
+
+    def store(self, key, depth, bound, score, move):
+        """Stores the result of searching a position, if the slot allows it"""
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[5] != self.generation or entry[1] <= depth:
+            self.entries[index] = (key, depth, bound, score, move, self.generation)
+            self.stores += 1
+
+    def clear(self):
+        """Removes every entry"""
+        self.entries = [None] * self.size
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """Transposition table in shared memory, for searches in several processes
+
+    Every slot takes two 64-bit words: the entry packed into one word, and
+    the hash xored with that word in the other. A process that reads a slot
+    while another one writes it gets a hash that does not match, so half
+    written entries are never used, without any locking.
+
+    Args:
+        bits: Number of hash bits used to pick a slot
+        words: The `words` of a table to share, a new table by default
+    """
+    # Bits of the generation kept in an entry
+    generation_mask = (1 << 32) - 1
+
+    def __init__(self, bits=18, words=None):
+        if words is None:
+            words = multiprocessing.RawArray(ctypes.c_uint64, 2 << bits)
+        self.words = words
+        self.size = len(words) // 2
+        self.mask = self.size - 1
+        self.entries = memoryview(words).cast('B').cast('Q')
+        self.generation = 0
+
+        self.hits = 0
+        self.stores = 0
+
+    def get(self, key):
+        """Looks up a position by its hash
+
+        Returns:
+            tuple: (depth, bound, score, move), None if the position is not stored
+        """
+        index = (key & self.mask) << 1
+        data = self.entries[index + 1]
+        if not data or self.entries[index] ^ data != key:
+            return None
+        self.hits += 1
+        move = data >> 20 & 7
+        return data & 63, data >> 6 & 3, (data >> 8 & 4095) - 2048, None if move == 7 else move
+
+    def store(self, key, depth, bound, score, move):
+        """Stores the result of searching a position, if the slot allows it"""
+        index = (key & self.mask) << 1
+        data = self.entries[index + 1]
+        generation = self.generation & self.generation_mask
+        if not data or data >> 24 != generation or data & 63 <= depth:
+            data = generation << 24 | (7 if move is None else move) << 20 | \
+                (score + 2048) << 8 | bound << 6 | depth
+            self.entries[index] = key ^ data
+            self.entries[index + 1] = data
+            self.stores += 1
+
+    def clear(self):
+        """Removes every entry"""
+        ctypes.memset(self.words, 0, ctypes.sizeof(self.words))
@@ -0,0 +1,165 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import config
+from utils import directions
+
+
+class AsyncAI:
+    """Runs an AI in a worker thread with a time budget per move
+
+    The AI plans on a snapshot of the game, so it can keep planning while the
+    game advances. As the last planned move is used up, planning for the
+    state after that move is already started. If no plan is ready when a move
+    is due, the AI has missed its deadline and a fallback move is used:
+
+        'keep': Keep the current direction
+        'safe': Keep the current direction if it is legal, else any legal move
+
+    A planner that is slower than its budget is not interrupted, the plan is
+    left to finish and thrown away if the game has moved on. From then on,
+    every plan is started from the state after enough fallback moves to
+    cover the time the last plans took, and those moves are played while it
+    runs. A planner that raises is treated like one that missed its deadline.
+
+    Register it like any other AI:
+
+        @snake.register_ai
+        @AsyncAI.wrap(snake, time_budget=0.05)
+        def super_ai(game):
+            return ['left', ..., 'down']
+
+    NB! Unlike regular AIs, the planning function is given the game to plan
+    on as its only argument, and must use it instead of the live game.
+    """
+    def __init__(self, game, planner, time_budget=config.AI_TIME_BUDGET, fallback='safe'):
+        if fallback not in ('keep', 'safe'):
+            raise ValueError(f'Unknown fallback \'{fallback}\'')
+        self.game = game
+        self.planner = planner
+        self.time_budget = time_budget
+        self.fallback = fallback
+
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.future_tick = None
+        self.planned = []
+        # Fallback moves at the front of `planned`, and how many to plan past
+        self.committed = 0
+        self.lead = 0
+
+        self.plans = 0
+        self.missed_deadlines = 0
+        self.stale_plans = 0
+        self.failed_plans = 0
+
+    @classmethod
+    def wrap(cls, game, **kwargs):
+        """Decorator for turning a planning function into an AsyncAI"""
+        return lambda planner: cls(game, planner, **kwargs)
+
+    def _submit(self, pending=()):
+        """Helper function to start planning from the state after the pending moves
+
+        If earlier plans missed their deadline, fallback moves for the ticks
+        they were late by are planned in advance, after the pending moves.
+        """
+        snapshot = self.game.snapshot()
+        for move in pending:
+            snapshot.step(move)
+        for _ in range(self.lead):
+            move = self._fallback_move(snapshot)
+            snapshot.step(move)
+            self.planned.append(move)
+            self.committed += 1
+            self.missed_deadlines += 1
+        self.future_tick = snapshot.ticks
+        self.future = self.executor.submit(self.planner, snapshot)
+
+    def _collect(self, timeout):
+        """Helper function to take the result of the running plan
+
+        Returns:
+            bool: True if the plan finished within the timeout without errors
+        """
+        try:
+            moves = self.future.result(timeout=timeout)
+        except TimeoutError:
+            return False
+        except Exception:
+            self.future = None
+            self.failed_plans += 1
+            return False
+
+        tick = self.future_tick
+        self.future = None
+        self.plans += 1
+        if isinstance(moves, str):
+            moves = [moves]
+
+        expected = self.game.ticks + len(self.planned)
+        if tick != expected:
+            # Planned for a state the game never reached, plan further ahead
+            self.stale_plans += 1
+            self.lead += max(1, expected - tick)
+        else:
+            if self.committed:
+                # Finished before the fallback moves ran out, plan less far ahead
+                self.lead -= 1
+            if moves:
+                self.planned.extend(moves)
+        return True
+
+    def _fallback_move(self, game):
+        """Helper function to pick a move when the deadline is missed"""
+        current = game.current_move()
+        if self.fallback == 'keep' and current:
+            return current
+
+        candidates = [current] if current else []
+        candidates += [move for move in directions if move != current]
+        for move in candidates:
+            if game.is_legal(move):
+                return move
+        return current or 'down'
+
+    def _miss_deadline(self):
+        """Helper function to play the fallback move, and plan from the state after it"""
+        self.missed_deadlines += 1
+        move = self._fallback_move(self.game)
+        if self.future is None:
+            self._submit([move])
+        # Else the worker is still busy, the running plan is left to finish
+        return [move]
+
+    def __call__(self):
+        """Returns the next move, waiting at most `time_budget` for the planner"""
+        deadline = time.perf_counter() + self.time_budget
+
+        if self.future is not None and self.future.done():
+            self._collect(0)
+
+        while not self.planned:
+            if self.future is None:
+                self._submit()
+                continue
+            if not self._collect(max(0, deadline - time.perf_counter())):
+                return self._miss_deadline()
+            if self.future is None and not self.planned and time.perf_counter() >= deadline:
+                # The planner finished in time, but without any usable moves
+                return self._miss_deadline()
+
+        if self.committed:
+            # Give the plan the rest of the budget while a fallback move is played
+            if self.future is not None:
+                self._collect(max(0, deadline - time.perf_counter()))
+            self.committed -= 1
+        move = self.planned.pop(0)
+        if not self.planned and self.future is None:
+            # Plan ahead while the last planned move is played
+            self._submit([move])
+        return [move]
+
+    def close(self):
+        """Drops any queued plans and stops the worker thread once the running plan is done"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,221 @@
+import numpy as np
+
+import config
+from engine import states, directions
+
+moves = list(directions)
+move_index = {move: i for i, move in enumerate(moves)}
+
+# Deltas and opposite move for each move index, in the order of `moves`
+deltas = np.array([directions[move] for move in moves], dtype=np.int64)
+opposite = np.array([move_index['down'], move_index['up'],
+                     move_index['right'], move_index['left']])
+
+
+class BatchSnake:
+    """N independent snake games stepped together
+
+    All games share the same board size and are stored as stacked arrays:
+
+        grid:      (N, width, height) game states, same values as `states`
+        body:      (N, width * height) ring buffer of flat body cells
+        heads:     (N,) ring index of the snake head
+        tails:     (N,) ring index of the snake tail
+        apples:    (N,) flat cell of the apple, -1 if there is none
+        lengths:   (N,) length the snake will grow to
+        direction: (N,) current move index of each snake
+
+    A flat cell is `x * height + y`. Games that are lost or won are frozen
+    until they are reset.
+    """
+    def __init__(self, n, width, height, snake_len=config.SNAKE_START_LEN, seed=None):
+        if snake_len > height - height // 2:
+            raise ValueError(f'Board {width}x{height} is too small for a snake of length {snake_len}')
+        self.n = n
+        self.width = width
+        self.height = height
+        self.cells = width * height
+        self.start_len = snake_len
+        self.rng = np.random.default_rng(seed)
+
+        self.grid = np.zeros((n, width, height), dtype=np.int8)
+        self.body = np.zeros((n, self.cells), dtype=np.int64)
+        self.heads = np.zeros(n, dtype=np.int64)
+        self.tails = np.zeros(n, dtype=np.int64)
+        self.apples = np.full(n, -1, dtype=np.int64)
+        self.lengths = np.zeros(n, dtype=np.int64)
+        self.direction = np.zeros(n, dtype=np.int64)
+        self.alive = np.zeros(n, dtype=bool)
+        self.won = np.zeros(n, dtype=bool)
+        self.ticks = np.zeros(n, dtype=np.int64)
+
+        self.reset()
+
+    @property
+    def flat_grid(self):
+        """(N, width * height) view of the game states"""
+        return self.grid.reshape(self.n, self.cells)
+
+    def reset(self, games=None):
+        """Resets the given games ( all if None ) to the start of a new game
+
+        Args:
+            games: Optional boolean mask or indices of the games to reset
+        """
+        idx = np.arange(self.n)[games] if games is not None else np.arange(self.n)
+        if not len(idx):
+            return
+
+        self.grid[idx] = states['board']
+        # Same start position as SnakeEngine, head at the bottom moving down
+        x = self.width // 2
+        ys = self.height // 2 + np.arange(self.start_len)
+        cells = x * self.height + ys
+        self.body[idx, :self.start_len] = cells
+        self.tails[idx] = 0
+        self.heads[idx] = self.start_len - 1
+        self.lengths[idx] = self.start_len
+        self.direction[idx] = move_index['down']
+        self.alive[idx] = True
+        self.won[idx] = False
+        self.ticks[idx] = 0
+
+        flat = self.flat_grid
+        flat[np.ix_(idx, cells[:-1])] = states['snake_body']
+        flat[idx, cells[-1]] = states['snake_head']
+        self.apples[idx] = -1
+        self._spawn_apples(idx)
+
+    def _body_count(self, idx):
+        """Helper function to get the current number of body cells"""
+        return (self.heads[idx] - self.tails[idx]) % self.cells + 1
+
+    def _spawn_apples(self, idx):
+        """Helper function to place a new apple on a random free cell
+
+        Games without any free cells are left without an apple.
+        """
+        flat = self.flat_grid
+        # Rejection sampling is cheap while the boards have room left
+        for _ in range(8):
+            if not len(idx):
+                return
+            cells = self.rng.integers(0, self.cells, size=len(idx))
+            free = flat[idx, cells] == states['board']
+            self.apples[idx[free]] = cells[free]
+            flat[idx[free], cells[free]] = states['apple']
+            idx = idx[~free]
+
+        for i in idx:
+            free = np.flatnonzero(flat[i] == states['board'])
+            if len(free):
+                cell = free[self.rng.integers(len(free))]
+                self.apples[i] = cell
+                flat[i, cell] = states['apple']
+
+    def _to_move_indices(self, actions):
+        """Helper function to convert moves to move indices
+
+        Accepts move names ('up', 'down', 'left', 'right') or indices, where
+        a negative index or None keeps the current direction.
+        """
+        if isinstance(actions, np.ndarray) and actions.dtype.kind in 'iu':
+            return actions.astype(np.int64, copy=False)
+        return np.array([-1 if a is None else move_index.get(a, a)
+                         for a in actions], dtype=np.int64)
+
+    def step(self, actions):
+        """Advances every running game a single tick
+
+        Args:
+            actions: One move per game, see `_to_move_indices`
+
+        Returns:
+            tuple: Boolean arrays (ate, died) for this tick
+        """
+        actions = self._to_move_indices(actions)
+        if actions.shape != (self.n,):
+            raise ValueError(f'Expected {self.n} moves, got {actions.shape}')
+
+        # Turning back into the neck is ignored, like in SnakeEngine
+        turn = (actions >= 0) & (actions < len(moves))
+        turn[turn] &= actions[turn] != opposite[self.direction[turn]]
+        self.direction[turn] = actions[turn]
+
+        idx = np.flatnonzero(self.alive)
+        ate = np.zeros(self.n, dtype=bool)
+        died = np.zeros(self.n, dtype=bool)
+        if not len(idx):
+            return ate, died
+        self.ticks[idx] += 1
+
+        flat = self.flat_grid
+        head_cells = self.body[idx, self.heads[idx]]
+        d = deltas[self.direction[idx]]
+        x = head_cells // self.height + d[:, 0]
+        y = head_cells % self.height + d[:, 1]
+
+        out = (x < 0) | (x >= self.width) | (y < 0) | (y >= self.height)
+        died[idx[out]] = True
+        idx, head_cells, x, y = idx[~out], head_cells[~out], x[~out], y[~out]
+        new_cells = x * self.height + y
+
+        # The tail moves out of the way before the head moves in
+        drop = self._body_count(idx) >= self.lengths[idx]
+        tail_cells = self.body[idx, self.tails[idx]]
+        target = flat[idx, new_cells]
+        crash = ((target == states['snake_body']) | (target == states['snake_head'])) & \
+            ~(drop & (new_cells == tail_cells))
+        died[idx[crash]] = True
+        idx, head_cells, new_cells = idx[~crash], head_cells[~crash], new_cells[~crash]
+        drop, tail_cells = drop[~crash], tail_cells[~crash]
+
+        drop_idx = idx[drop]
+        flat[drop_idx, tail_cells[drop]] = states['board']
+        self.tails[drop_idx] = (self.tails[drop_idx] + 1) % self.cells
+
+        eaten = flat[idx, new_cells] == states['apple']
+        flat[idx, head_cells] = states['snake_body']
+        flat[idx, new_cells] = states['snake_head']
+        self.heads[idx] = (self.heads[idx] + 1) % self.cells
+        self.body[idx, self.heads[idx]] = new_cells
+
+        eat_idx = idx[eaten]
+        ate[eat_idx] = True
+        self.lengths[eat_idx] += 1
+        self.apples[eat_idx] = -1
+        self._spawn_apples(eat_idx)
+
+        # Won when no empty cells are left, like SnakeEngine
+        free = self.cells - self._body_count(idx) - (self.apples[idx] >= 0)
+        full = free == 0
+        self.won[idx[full]] = True
+
+        self.alive[died] = False
+        self.alive[idx[full]] = False
+        return ate, died
+
+    def game_state(self, i):
+        """Returns the game state of game `i`, same layout as SnakeEngine"""
+        return self.grid[i]
+
+    def get_snake(self, i):
+        """Returns the snake of game `i` as a list of [x, y], tail first"""
+        count = self._body_count(i)
+        ring = (self.tails[i] + np.arange(count)) % self.cells
+        cells = self.body[i, ring]
+        return [[int(c // self.height), int(c % self.height)] for c in cells]
+
+    def get_snake_head_positions(self):
+        """Returns an (N, 2) array with the head position of every game"""
+        cells = self.body[np.arange(self.n), self.heads]
+        return np.stack([cells // self.height, cells % self.height], axis=1)
+
+    def get_apple_positions(self):
+        """Returns an (N, 2) array with the apple position of every game
+
+        Games without an apple get (-1, -1).
+        """
+        pos = np.stack([self.apples // self.height, self.apples % self.height], axis=1)
+        pos[self.apples < 0] = -1
+        return pos
@@ -0,0 +1,327 @@
+"""Benchmarks of the hot paths of the snake game
+
+Every benchmark is run for each engine, board size and snake length, and
+the results are written as JSON so runs can be compared:
+
+    ticks:        Ticks per second of the logic loop ( `step` )
+    is_legal:     Calls per second of `is_legal` on a legal sequence of moves
+    is_winning:   Calls per second of `is_winning` on the same sequence
+    spawn_apple:  Apples spawned per second ( `_spawn_apple` )
+    update_state: Full game state rebuilds per second ( `_update_game_state` )
+    render_full:  Frames per second of a full redraw ( `_update_display` )
+    render_move:  Frames per second of drawing a single move
+                  ( `_update_changed_cells` )
+
+The snake follows a Hamiltonian cycle, so it never dies, and snake lengths
+are given as the part of the board filled by the snake. The render
+benchmarks use the board of `SnakeGame`, given by `config.py`.
+
+Example:
+    $ python benchmark.py --output before.json
+    $ python benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+import config
+from bitboard import BitboardSnakeEngine
+from engine import SnakeEngine, states
+from utils import directions
+
+engines = {
+    'engine': SnakeEngine,
+    'bitboard': BitboardSnakeEngine,
+}
+
+
+def hamiltonian_cycle(width, height):
+    """Returns the cells of a cycle visiting every cell of the board once
+
+    The cycle runs along the top row, snakes back and forth through the
+    remaining columns and returns up the first column. There is no such
+    cycle if both sides are odd, then the last row is left out.
+    """
+    if height % 2:
+        if width % 2 == 0:
+            return [(x, y) for y, x in hamiltonian_cycle(height, width)]
+        height -= 1
+    cycle = [(x, 0) for x in range(width)]
+    for y in range(1, height):
+        xs = range(width - 1, 0, -1) if y % 2 else range(1, width)
+        cycle.extend((x, y) for x in xs)
+    cycle.extend((0, y) for y in range(height - 1, 0, -1))
+    return cycle
+
+
+def _cycle_moves(cycle):
+    """Helper function to map every cell of a cycle to the move to the next cell"""
+    moves = {delta: move for move, delta in directions.items()}
+    return {p: moves[(q[0] - p[0], q[1] - p[1])]
+            for p, q in zip(cycle, cycle[1:] + cycle[:1])}
+
+
+def _snake_length(cycle, fill):
+    """Helper function to get the snake length for a part of the board"""
+    return min(max(config.SNAKE_START_LEN, int(fill * len(cycle))), len(cycle) - 2)
+
+
+def setup_game(game, cycle, length):
+    """Places a snake of the given length along the cycle, heading along it
+
+    Returns:
+        SnakeEngine: The game
+    """
+    game.reset(game.seed)
+    game.snake = deque(cycle[:length])
+    game.snake_len = length
+    game.head_seq = length - 1
+    game.snake_cells = {seg: i for i, seg in enumerate(game.snake)}
+    game.apple = None
+    game.dropped_tail = None
+    game._update_game_state()
+    game._spawn_apple()
+
+    head, neck = game.snake[-1], game.snake[-2]
+    game.snake_delta_x = head[0] - neck[0]
+    game.snake_delta_y = head[1] - neck[1]
+    return game
+
+
+def _measure(function, min_time):
+    """Helper function to call a function repeatedly for at least min_time seconds
+
+    Returns:
+        dict: Number of calls, seconds spent and calls per second
+    """
+    calls = 0
+    batch = 1
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_time:
+        for _ in range(batch):
+            function()
+        calls += batch
+        batch *= 2
+        elapsed = time.perf_counter() - start
+    return {'calls': calls, 'seconds': elapsed, 'per_second': calls / elapsed}
+
+
+def bench_ticks(game, cycle, length, min_time):
+    """Ticks per second of the logic loop, starting over whenever the game is won"""
+    moves = _cycle_moves(cycle)
+
+    def tick():
+        if not game.is_running:
+            setup_game(game, cycle, length)
+        game.step(moves[game.snake[-1]])
+
+    setup_game(game, cycle, length)
+    return _measure(tick, min_time)
+
+
+def bench_is_legal(game, cycle, length, min_time, depth):
+    """Calls per second of is_legal on the next `depth` moves along the cycle"""
+    setup_game(game, cycle, length)
+    sequence = _path_along_cycle(game, cycle, depth)
+    return _measure(lambda: game.is_legal(sequence), min_time)
+
+
+def bench_is_winning(game, cycle, length, min_time, depth):
+    """Calls per second of is_winning on the next `depth` moves along the cycle"""
+    setup_game(game, cycle, length)
+    sequence = _path_along_cycle(game, cycle, depth)
+    return _measure(lambda: game.is_winning(sequence), min_time)
+
+
+def _path_along_cycle(game, cycle, depth):
+    """Helper function to get the next moves of the snake along the cycle"""
+    moves = _cycle_moves(cycle)
+    index = cycle.index(game.snake[-1])
+    return [moves[cycle[(index + i) % len(cycle)]] for i in range(depth)]
+
+
+def bench_spawn_apple(game, cycle, length, min_time):
+    """Apples spawned per second, the apple is cleared again between spawns"""
+    setup_game(game, cycle, length)
+
+    def spawn():
+        game._set_cell(game.apple, states['board'])
+        game._spawn_apple()
+
+    return _measure(spawn, min_time)
+
+
+def bench_update_state(game, cycle, length, min_time):
+    """Full rebuilds of the game state per second"""
+    setup_game(game, cycle, length)
+    return _measure(game._update_game_state, min_time)
+
+
+def bench_render(fills, min_time):
+    """Frames per second of full and single move redraws on the SnakeGame board
+
+    Yields:
+        dict: Result of each benchmark
+    """
+    from snake import SnakeGame
+
+    game = SnakeGame()
+    width, height = game.width, game.height
+    cycle = hamiltonian_cycle(width, height)
+    moves = _cycle_moves(cycle)
+
+    for fill in fills:
+        length = _snake_length(cycle, fill)
+        setup_game(game, cycle, length)
+        result = _measure(game._update_display, min_time)
+        yield _result('render_full', 'snake', width, height, length, result)
+
+        def draw_move():
+            if game.snake_len >= len(cycle) - 1:
+                # Start over before the game is won, which closes the window
+                setup_game(game, cycle, length)
+                game._update_display()
+            game.step(moves[game.snake[-1]])
+            start = time.perf_counter()
+            game._update_changed_cells()
+            return time.perf_counter() - start
+
+        setup_game(game, cycle, length)
+        game._update_display()
+        frames = 0
+        seconds = 0
+        while seconds < min_time:
+            seconds += draw_move()
+            frames += 1
+        result = {'calls': frames, 'seconds': seconds, 'per_second': frames / seconds}
+        yield _result('render_move', 'snake', width, height, length, result)
+
+
+def _result(benchmark, engine, width, height, length, result):
+    """Helper function to label a measurement"""
+    return {'benchmark': benchmark, 'engine': engine, 'width': width,
+            'height': height, 'length': length, **result}
+
+
+def run_benchmarks(sizes, fills, engine_names=tuple(engines), min_time=0.2, depth=16,
+                   render=True):
+    """Runs every benchmark for every engine, board size and snake length
+
+    Args:
+        sizes: List of (width, height) board sizes in cells
+        fills: List of snake lengths, as the part of the board filled by the
+            snake
+        engine_names: Names of the engines to benchmark, see `engines`
+        min_time: Minimum number of seconds to run each benchmark for
+        depth: Number of moves checked by is_legal and is_winning
+        render: Also run the render benchmarks, which open a window
+
+    Yields:
+        dict: Result of each benchmark
+    """
+    for name in engine_names:
+        for width, height in sizes:
+            cycle = hamiltonian_cycle(width, height)
+            game = engines[name](width, height, seed=0)
+            for fill in fills:
+                length = _snake_length(cycle, fill)
+                results = {
+                    'ticks': bench_ticks(game, cycle, length, min_time),
+                    'is_legal': bench_is_legal(game, cycle, length, min_time, depth),
+                    'is_winning': bench_is_winning(game, cycle, length, min_time, depth),
+                    'spawn_apple': bench_spawn_apple(game, cycle, length, min_time),
+                    'update_state': bench_update_state(game, cycle, length, min_time),
+                }
+                for benchmark, result in results.items():
+                    yield _result(benchmark, name, width, height, length, result)
+
+    if render:
+        yield from bench_render(fills, min_time)
+
+
+def compare(old, new):
+    """Compares the results of two runs
+
+    Returns:
+        list: (key, old per second, new per second, ratio) for every result
+            found in both runs, where the key is (benchmark, engine, width,
+            height, length)
+    """
+    def key(result):
+        return (result['benchmark'], result['engine'], result['width'],
+                result['height'], result['length'])
+
+    old_results = {key(result): result for result in old['results']}
+    rows = []
+    for result in new['results']:
+        if key(result) in old_results:
+            before = old_results[key(result)]['per_second']
+            rows.append((key(result), before, result['per_second'],
+                         result['per_second'] / before))
+    return rows
+
+
+def parse_sizes(text):
+    """Helper function to parse board sizes like '16,32x16'"""
+    sizes = []
+    for part in text.split(','):
+        width, _, height = part.partition('x')
+        sizes.append((int(width), int(height or width)))
+    return sizes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the snake game')
+    parser.add_argument('--sizes', default='16,32,64,128',
+                        help='Board sizes like 16,32x16')
+    parser.add_argument('--fills', default='0,0.25,0.5,0.9',
+                        help='Snake lengths as the part of the board filled')
+    parser.add_argument('--engines', default=','.join(engines),
+                        help=f'Engines to benchmark, out of {", ".join(engines)}')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='Minimum seconds per benchmark')
+    parser.add_argument('--depth', type=int, default=16,
+                        help='Number of moves checked by is_legal and is_winning')
+    parser.add_argument('--no-render', action='store_true', help='Skip the render benchmarks')
+    parser.add_argument('--output', default='benchmark.json', help='File to write results to')
+    parser.add_argument('--compare', default=None, help='Earlier results to compare against')
+    args = parser.parse_args(argv)
+
+    results = []
+    for result in run_benchmarks(parse_sizes(args.sizes),
+                                 [float(fill) for fill in args.fills.split(',')],
+                                 args.engines.split(','), args.min_time, args.depth,
+                                 not args.no_render):
+        results.append(result)
+        print(f'{result["benchmark"]:>12} {result["engine"]:>8} '
+              f'{result["width"]:>4}x{result["height"]:<4} length {result["length"]:>6}: '
+              f'{result["per_second"]:>12.1f} /s', file=sys.stderr)
+
+    run = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'min_time': args.min_time,
+        'depth': args.depth,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(run, f, indent=4)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        for (benchmark, engine, width, height, length), before, after, ratio in compare(old, run):
+            print(f'{benchmark:>12} {engine:>8} {width:>4}x{height:<4} length {length:>6}: '
+                  f'{before:>12.1f} -> {after:>12.1f} /s ( x{ratio:.2f} )', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
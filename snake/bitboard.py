@@ -0,0 +1,243 @@
+"""Bit-per-cell board representation for very large snake boards
+
+A bitboard is a plain Python int with one bit per cell. Cells are stored
+column by column, with one unused guard bit at the end of every column so
+shifts never wrap from one column into the next:
+
+    bit(x, y) = x * (height + 1) + y
+
+Moving every cell of a bitboard one step is a single shift followed by a
+mask, which makes neighbour, flood and collision queries cheap even on
+boards of 512x512 cells and more.
+"""
+import numpy as np
+
+from engine import SnakeEngine, states
+
+
+class Bitboard:
+    """Geometry and shift-and-mask operations for bitboards of one size"""
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.stride = height + 1
+
+        # Every bit except the guard bit on top of each column
+        bits = np.ones((width, self.stride), dtype=np.uint8)
+        bits[:, height] = 0
+        self.full = int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+    def bit(self, pos):
+        """Returns the bitboard with only the cell at pos set"""
+        return 1 << (pos[0] * self.stride + pos[1])
+
+    def from_positions(self, positions):
+        """Returns the bitboard with all the given cells set"""
+        bits = 0
+        for pos in positions:
+            bits |= 1 << (pos[0] * self.stride + pos[1])
+        return bits
+
+    def positions(self, bits):
+        """Yields the position of every cell set in a bitboard"""
+        while bits:
+            low = bits & -bits
+            yield divmod(low.bit_length() - 1, self.stride)
+            bits ^= low
+
+    def count(self, bits):
+        """Returns the number of cells set in a bitboard"""
+        return bin(bits).count('1')
+
+    def shift(self, bits, move):
+        """Moves every cell of a bitboard one step in the given direction"""
+        if move == 'up':
+            return (bits >> 1) & self.full
+        if move == 'down':
+            return (bits << 1) & self.full
+        if move == 'left':
+            return bits >> self.stride
+        if move == 'right':
+            return (bits << self.stride) & self.full
+        raise ValueError(f'Invalid Move \'{move}\'')
+
+    def neighbours(self, bits):
+        """Returns all cells next to a cell set in the bitboard"""
+        return (((bits >> 1) | (bits << 1) | (bits << self.stride)) & self.full) | \
+            (bits >> self.stride)
+
+    def flood(self, seed, passable):
+        """Returns every cell reachable from the seed through passable cells
+
+        The seed itself does not need to be passable, and is not included in
+        the result unless it is.
+        """
+        reached = seed & passable
+        frontier = seed
+        while frontier:
+            frontier = self.neighbours(frontier) & passable & ~reached
+            reached |= frontier
+        return reached
+
+    def size(self):
+        """Returns the number of bytes needed to store a bitboard"""
+        return (self.width * self.stride + 7) // 8
+
+    def unpack(self, data):
+        """Returns the bits of a bitboard given as bytes, as a (width, height) uint8 view"""
+        flat = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little')
+        return flat[:self.width * self.stride].reshape(self.width, self.stride)[:, :self.height]
+
+    def to_array(self, bits):
+        """Returns the bitboard as a (width, height) boolean NumPy array"""
+        return self.unpack(bits.to_bytes(self.size(), 'little')).astype(bool)
+
+
+class BitboardSnakeEngine(SnakeEngine):
+    """SnakeEngine for very large boards, backed by a bitset
+
+    The body is kept as a `bytearray` with one bit per cell, in the layout
+    of a bitboard, instead of a NumPy game state. Setting or clearing a cell
+    changes a single byte, and collisions are answered by `snake_cells`, so
+    the work per tick does not grow with the size of the board. Apples are
+    placed by rejection sampling against the bitset.
+
+    The bitset is turned into a bitboard ( a Python int ) only when a flood
+    fill runs, and into a NumPy mask of free cells only for distance fields
+    and regions. `game_state` is still available, but is built on request.
+    """
+    def __init__(self, width, height, **kwargs):
+        self.board = Bitboard(width, height)
+        super().__init__(width, height, **kwargs)
+
+    @property
+    def game_state(self):
+        """The game state as a NumPy array, built from the bitset"""
+        game_state = self.board.unpack(self.cells) * float(states['snake_body'])
+        game_state[self.snake[-1]] = states['snake_head']
+        if self.apple:
+            game_state[self.apple] = states['apple']
+        return game_state
+
+    @property
+    def occupied(self):
+        """The body as a bitboard, built from the bitset once per game state"""
+        if self.occupied_version != self.state_version:
+            self.occupied_bits = int.from_bytes(self.cells, 'little')
+            self.occupied_version = self.state_version
+        return self.occupied_bits
+
+    def _index(self, pos):
+        """Helper function to get the bit index of a cell"""
+        return pos[0] * self.board.stride + pos[1]
+
+    def _is_occupied(self, index):
+        """Helper function to check a single bit of the bitset"""
+        return self.cells[index >> 3] >> (index & 7) & 1
+
+    def _update_game_state(self):
+        """Rebuilds the bitset from the snake and apple"""
+        self.state_version += 1
+        self.cells = bytearray(self.board.size())
+        for pos in self.snake or []:
+            index = self._index(pos)
+            self.cells[index >> 3] |= 1 << (index & 7)
+        self.occupied_version = None
+        self.apple_index = self._index(self.apple) if self.apple else None
+        self.free_count = self.width * self.height - len(self.snake or []) - \
+            (1 if self.apple else 0)
+        self.free_cells = None
+        self.free_slot = None
+
+    def _set_cell(self, pos, value):
+        """Helper function to set a single cell of the bitset"""
+        index = self._index(pos)
+        was_free = not self._is_occupied(index) and index != self.apple_index
+
+        if self.apple_index == index:
+            self.apple_index = None
+        if value == states['apple']:
+            self.apple_index = index
+        if value in (states['board'], states['apple']):
+            if self._is_occupied(index):
+                self.cells[index >> 3] ^= 1 << (index & 7)
+        else:
+            self.cells[index >> 3] |= 1 << (index & 7)
+
+        is_free = not self._is_occupied(index) and index != self.apple_index
+        self.free_count += is_free - was_free
+
+    def _check_win_condition(self):
+        """Helper function to check for win-conditions"""
+        if not self.free_count:
+            self._game_won()
+
+    def _free_indexes(self):
+        """Helper function to get the flat index ( x * height + y ) of every free cell"""
+        free = self.board.unpack(self.cells) == 0
+        if self.apple_index is not None:
+            free[divmod(self.apple_index, self.board.stride)] = False
+        return np.flatnonzero(free)
+
+    def _get_random_position(self):
+        """Helper function to generate a random, legal position
+
+        Returns None if there are no legal positions left
+        """
+        if not self.free_count:
+            return None
+
+        # Rejection sampling is cheap while the board has room left
+        for _ in range(32):
+            pos = (self.rng.randrange(self.width), self.rng.randrange(self.height))
+            index = self._index(pos)
+            if not self._is_occupied(index) and index != self.apple_index:
+                return pos
+
+        cell = int(self._free_indexes()[self.rng.randrange(self.free_count)])
+        return divmod(cell, self.height)
+
+    def _get_legal_positions(self):
+        """Helper function to get all current legal positions"""
+        return np.stack(np.divmod(self._free_indexes(), self.height), axis=1)
+
+    def _get_free_mask(self):
+        """Helper function to get a mask of the cells the snake can move to"""
+        return self.board.unpack(self.cells) == 0
+
+    def is_free(self, pos):
+        """Checks if a position is inside the board and not part of the snake"""
+        if not (0 <= pos[0] < self.width and 0 <= pos[1] < self.height):
+            return False
+        return not self._is_occupied(self._index(pos))
+
+    def flood_fill(self, pos):
+        """Returns the bitboard of every free cell reachable from pos"""
+        return self.board.flood(self.board.bit(pos), self.board.full & ~self.occupied)
+
+    def reachable_area(self, pos):
+        """Function to get the number of free cells reachable from a position
+
+        Same as SnakeEngine.reachable_area, but found with a bitboard flood
+        fill instead of labelling the whole board.
+        """
+        if not (0 <= pos[0] < self.width and 0 <= pos[1] < self.height):
+            return 0
+        return self.board.count(self.flood_fill(pos))
+
+    def snapshot(self):
+        """Returns an independent copy of the current game"""
+        game = object.__new__(type(self))
+        game.__dict__.update(self.__dict__)
+        game.snake = self.snake.copy()
+        game.snake_cells = self.snake_cells.copy()
+        game.cells = self.cells.copy()
+        game.rng = type(self.rng)()
+        game.rng.setstate(self.rng.getstate())
+        game.moves = list(self.moves)
+        game.distance_fields = {}
+        game.distance_fields_version = None
+        game.record = False
+        game.recorded_moves = None
+        game.recorded_apples = None
+        return game
@@ -6,3 +6,6 @@ MIN_SPRITE_SIZE = 30
 SNAKE_START_LEN  = 3
 
 CLOCK_SPEED = 10
+EVENT_INTERVAL = 1 / 30 # Seconds between event checks when the clock is uncapped
+
+AI_TIME_BUDGET = 0.1 # Seconds an asynchronous AI may spend per move
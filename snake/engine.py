@@ -0,0 +1,722 @@
+import random
+from collections import deque, namedtuple
+import numpy as np
+
+import utils
+import config
+import pathfinding
+from utils import directions
+
+states = {
+    'board': 0,
+    'snake_body': 1,
+    'snake_head': 2,
+    'apple': 3
+}
+
+
+MoveEvaluation = namedtuple('MoveEvaluation', ['legal', 'apple_step', 'fail_step'])
+
+
+def default_grid_size():
+    """Helper function to get the grid size (in cells) given by the config"""
+    sprite_size = utils.find_common_divisor(config.WIDTH,
+                                            config.HEIGHT,
+                                            config.MAX_SPRITE_SIZE,
+                                            config.MIN_SPRITE_SIZE)
+    if not sprite_size:
+        raise ValueError(f'Invalid game size {config.WIDTH}x{config.HEIGHT}')
+    return config.WIDTH // sprite_size, config.HEIGHT // sprite_size
+
+
+class SnakeEngine:
+    """Headless snake game logic
+
+    The engine knows nothing about windows, sprites or clocks. Positions are
+    given in game state coordinates ( cells ), and the game is advanced one
+    tick at a time through `step()`, or played to the end through `run()`.
+    """
+    def __init__(self, width=None, height=None, snake_len=config.SNAKE_START_LEN,
+                 seed=None, record=False):
+        if width is None or height is None:
+            width, height = default_grid_size()
+        if snake_len > height - height // 2:
+            raise ValueError(f'Board {width}x{height} is too small for a snake of length {snake_len}')
+        self.width = width
+        self.height = height
+        self.start_len = snake_len
+        self.record = record
+
+        self.moves = []
+        self.ai = lambda: self._game_over(msg='No AI registered!')
+
+        # Bumped every time the game state changes, used to invalidate caches
+        self.state_version = 0
+        self.distance_fields = {}
+        self.distance_fields_version = None
+        self.regions = None
+        self.regions_version = None
+
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """Resets the engine to the initial state of a new game
+
+        Every game draws from its own random generator. Resetting with the
+        same seed replays the same apples for the same moves. Without a
+        seed, a new one is drawn and stored in `seed`. Recorded games need
+        a seed that fits into a replay, an int from 0 to 2**64 - 1.
+        """
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        elif self.record and not (isinstance(seed, int) and 0 <= seed < 2 ** 64):
+            raise ValueError(f'Seed {seed!r} can not be stored in a replay, '
+                             'use an int from 0 to 2**64 - 1')
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+        # Effective moves ( as deltas ) and apple spawns, used for replays
+        self.recorded_moves = [] if self.record else None
+        self.recorded_apples = [] if self.record else None
+
+        self.snake = None
+        self.snake_cells = {}
+        self.head_seq = 0
+        self.apple = None
+        self.dropped_tail = None
+
+        self.snake_delta_x = 0
+        self.snake_delta_y = 0
+
+        self.snake_len = self.start_len
+        self.ticks = 0
+        self.is_running = True
+        self.won = False
+        self.cause = None
+        self.message = None
+        self.moves = []
+
+        self.snake = self._init_snake()
+        self.head_seq = len(self.snake) - 1
+        self.snake_cells = {seg: i for i, seg in enumerate(self.snake)}
+        self._update_game_state()
+        self._spawn_apple()
+
+    def _set_direction(self, direction):
+        """Helper function to set snake direction delta"""
+        if direction == 'up' and self.snake_delta_y != 1 and \
+                not self._is_stationary():
+            self.snake_delta_y = -1
+            self.snake_delta_x = 0
+        elif direction == 'down' and self.snake_delta_y != -1:
+            self.snake_delta_y = 1
+            self.snake_delta_x = 0
+        elif direction == 'left' and self.snake_delta_x != 1:
+            self.snake_delta_x = -1
+            self.snake_delta_y = 0
+        elif direction == 'right' and self.snake_delta_x != -1:
+            self.snake_delta_x = 1
+            self.snake_delta_y = 0
+        else:
+            # Unknown move - do nothing
+            pass
+
+    def _is_stationary(self):
+        """Helper function to check if snake is standing still"""
+        return self.snake_delta_x == 0 and self.snake_delta_y == 0
+
+    def current_move(self):
+        """Returns the current direction as a move name, None if the snake is standing still"""
+        delta = (self.snake_delta_x, self.snake_delta_y)
+        return next((move for move, d in directions.items() if d == delta), None)
+
+    def _move_snake(self):
+        """Helper function to move snake position
+
+        The body is a deque of cells, and `snake_cells` maps every cell of
+        the body to the tick it was entered on ( `head_seq` ). Moving the
+        snake is therefore O(1). If the head moves into the body, the cell
+        keeps its old entry, which is what `_check_collision_with_self`
+        looks for.
+        """
+        x, y = self.snake[-1]
+        snake_head = (x + self.snake_delta_x, y + self.snake_delta_y)
+        self.snake.append(snake_head)
+
+        self.dropped_tail = None
+        if len(self.snake) > self.snake_len:
+            self.dropped_tail = self.snake.popleft()
+            del self.snake_cells[self.dropped_tail]
+
+        self.head_seq += 1
+        self.snake_cells.setdefault(snake_head, self.head_seq)
+
+        if self.record:
+            self.recorded_moves.append((self.snake_delta_x, self.snake_delta_y))
+
+    def _check_if_apple_eaten(self):
+        """Helper function to check if snake has eaten the apple"""
+        if self.snake[-1] == self.apple:
+            self.snake_len += 1
+            self._spawn_apple()
+
+    def _check_collision_with_self(self):
+        """Helper function to check if snake has eaten itself"""
+        if self.snake_cells[self.snake[-1]] != self.head_seq:
+            self.cause = 'self'
+            self._game_over()
+
+    def _check_out_of_bounds(self):
+        """Helper function to check if snake has moved outside the board"""
+        snake_head = self.snake[-1]
+        if snake_head[0] >= self.width or snake_head[0] < 0 or \
+                snake_head[1] >= self.height or snake_head[1] < 0:
+            self.cause = 'wall'
+            self._game_over()
+
+    def _check_win_condition(self):
+        """Helper function to check for win-conditions"""
+        if not self.free_count:
+            self._game_won()
+
+    def _get_random_position(self):
+        """Helper function to generate a random, legal position
+
+        Returns None if there are no legal positions left
+        """
+        if not self.free_count:
+            return None
+        cell = int(self.free_cells[self.rng.randrange(self.free_count)])
+        return divmod(cell, self.height)
+
+    def _spawn_apple(self):
+        """Helper function to place the apple on a random, legal position"""
+        self.apple = self._get_random_position()
+        if self.apple:
+            self._set_cell(self.apple, states['apple'])
+        if self.record:
+            self.recorded_apples.append(self.apple)
+
+    def _init_snake(self):
+        """Helper function to generate initial snake position"""
+        snake = deque()
+        for i in range(self.snake_len):
+            x = self.width // 2
+            y = self.height // 2 + i
+            snake.append((x, y))
+        return snake
+
+    def _get_legal_positions(self):
+        """Helper function to get all current legal positions"""
+        cells = self.free_cells[:self.free_count]
+        return np.stack(np.divmod(cells, self.height), axis=1)
+
+    def _game_over(self, msg='You Lost'):
+        """Helper function to register a loss-condition"""
+        self.is_running = False
+        self.won = False
+        self.message = msg
+
+    def _game_won(self, msg='You Won!'):
+        """Helper function to register a win-condition"""
+        self.is_running = False
+        self.won = True
+        self.message = msg
+
+    def _update_game_state(self):
+        """Converts the snake and apple into a 2D numpy representation and
+        updates the game state
+
+        Possible game states:
+            0: Empty location
+            1: Snake body segment
+            2: Snake head segment
+            3: Apple
+        """
+        self.game_state = np.zeros((self.width, self.height))
+        self.state_version += 1
+
+        if self.snake:
+            for segment in self.snake:
+                self.game_state[segment] = states['snake_body']
+            self.game_state[self.snake[-1]] = states['snake_head']
+
+        if self.apple:
+            self.game_state[self.apple] = states['apple']
+
+        # Free cells are kept as flat cells ( `x * height + y` ) at the front
+        # of an array for O(1) random sampling, and the slot of every free
+        # cell is kept for O(1) removal ( -1 for cells that are not free )
+        free = np.flatnonzero(self.game_state == states['board']).astype(np.int32)
+        self.free_count = len(free)
+        self.free_cells = np.empty(self.width * self.height, dtype=np.int32)
+        self.free_cells[:self.free_count] = free
+        self.free_slot = np.full(self.width * self.height, -1, dtype=np.int32)
+        self.free_slot[free] = np.arange(self.free_count, dtype=np.int32)
+
+    def _set_cell(self, pos, value):
+        """Helper function to set a single cell of the game state
+
+        Keeps the free cells up to date in O(1).
+        """
+        self.game_state[pos] = value
+        cell = pos[0] * self.height + pos[1]
+        slot = self.free_slot[cell]
+        if value == states['board']:
+            if slot < 0:
+                self.free_cells[self.free_count] = cell
+                self.free_slot[cell] = self.free_count
+                self.free_count += 1
+        elif slot >= 0:
+            # Swap with the last free cell and drop it
+            self.free_count -= 1
+            last = self.free_cells[self.free_count]
+            self.free_cells[slot] = last
+            self.free_slot[last] = slot
+            self.free_slot[cell] = -1
+
+    def _update_game_state_after_move(self):
+        """Applies the latest move of the snake to the game state
+
+        Only the cells that changed are touched: the dropped tail is cleared,
+        the previous head becomes a body segment and the new head is added.
+        """
+        self.state_version += 1
+        if self.dropped_tail:
+            self._set_cell(self.dropped_tail, states['board'])
+        if len(self.snake) > 1:
+            self._set_cell(self.snake[-2], states['snake_body'])
+        self._set_cell(self.snake[-1], states['snake_head'])
+
+    def _next_move(self):
+        """Helper function to get the next move from the registered AI"""
+        if not self.moves:
+            self.moves = self.ai()
+            if not self.moves:
+                self.cause = 'no moves'
+                self._game_over()
+                return None
+            if isinstance(self.moves, str):  # For compatibility to older versions
+                self.moves = [self.moves]
+        return self.moves.pop(0)
+
+    def step(self, direction=None):
+        """Advances the game a single tick
+
+        Args:
+            direction: Optional move ('up', 'down', 'left' or 'right') to
+                apply before moving the snake
+
+        Returns:
+            bool: True if the game is still running, else False
+        """
+        if direction is not None:
+            self._set_direction(direction)
+
+        if not self.is_running:
+            return False
+
+        self.ticks += 1
+        if self._is_stationary():
+            return True
+
+        self._move_snake()
+        self._check_out_of_bounds()
+        if not self.is_running:
+            return False
+        self._check_collision_with_self()
+        if not self.is_running:
+            return False
+        self._update_game_state_after_move()
+        self._check_if_apple_eaten()
+        self._check_win_condition()
+        return self.is_running
+
+    def run(self, max_ticks=None, max_stall=None):
+        """Plays the game with the registered AI until it ends
+
+        Args:
+            max_ticks: Optional upper limit on the number of ticks to play
+            max_stall: Optional upper limit on the number of ticks to play
+                without eating an apple
+
+        Returns:
+            bool: True if the game was won, else False
+        """
+        last_apple_tick, last_len = self.ticks, self.snake_len
+        while self.is_running:
+            if self.snake_len != last_len:
+                last_apple_tick, last_len = self.ticks, self.snake_len
+            if (max_ticks is not None and self.ticks >= max_ticks) or \
+                    (max_stall is not None and self.ticks - last_apple_tick >= max_stall):
+                self.cause = 'max ticks'
+                break
+            direction = self._next_move()
+            if direction is None:
+                break
+            self.step(direction)
+        return self.won
+
+    def is_legal(self, moves):
+        """Function to check if a sequence of moves is legal / will not end
+        in a loss-condition
+
+        This function will simulate moving the snake according to the
+        provided sequence of moves.
+
+        Returns:
+            bool: True if all the moves are legal
+            bool: False if any of the moves end in a loss-condition
+        """
+        if isinstance(moves, str):
+            moves = [moves]
+
+        # Instead of copying the snake, cells are looked up by the tick they
+        # were entered on. A cell is part of the simulated snake as long as
+        # it was entered after the simulated tail.
+        x, y = self.snake[-1]
+        length = len(self.snake)
+        head_seq = self.head_seq
+        tail_seq = head_seq - length + 1
+        visited = {}
+
+        for move in moves:
+            if move not in directions:
+                # Illegal move?
+                return False
+
+            # Simulate move
+            d_x, d_y = directions[move]
+            x += d_x
+            y += d_y
+            head_seq += 1
+            if length < self.snake_len:
+                length += 1
+            else:
+                tail_seq += 1
+
+            # Out of bounds
+            if (x < 0 or x >= self.width) or (y < 0 or y >= self.height):
+                return False
+
+            # Collision with self
+            seq = visited.get((x, y), self.snake_cells.get((x, y)))
+            if seq is not None and seq >= tail_seq:
+                return False
+            visited[(x, y)] = head_seq
+
+        return True
+
+    def is_winning(self, moves):
+        """Function to check if a sequence of moves lead to the apple
+
+        NB! This function will not check for legal moves
+
+        Returns:
+            bool: True if the sequence lead to the apple
+            bool: False if the sequence does not lead to the apple
+        """
+        if self.apple is None:
+            return False
+        temp_head = list(self.snake[-1])
+
+        if isinstance(moves, str):
+            moves = [moves]
+
+        for move in moves:
+            if move not in directions:
+                # Illegal move?
+                return False
+
+            d_x, d_y = directions[move]
+            temp_head[0] += d_x
+            temp_head[1] += d_y
+
+            if temp_head[0] == self.apple[0] and temp_head[1] == self.apple[1]:
+                return True
+
+        return False
+
+    def _build_move_tree(self, candidates):
+        """Helper function to build a move tree ( trie ) from candidates
+
+        Every node maps a move to its child node. The key None holds the
+        keys to report results under for sequences ending in that node:
+        the candidate index for a list of sequences, and the path of moves
+        for the leaves of a given tree.
+        """
+        tree = {}
+        if isinstance(candidates, dict):
+            stack = [(candidates, tree, ())]
+            while stack:
+                source, node, path = stack.pop()
+                if not source:
+                    node[None] = [path]
+                for move, child in source.items():
+                    node[move] = {}
+                    stack.append((child, node[move], path + (move,)))
+            return tree
+
+        for i, moves in enumerate(candidates):
+            if isinstance(moves, str):
+                moves = [moves]
+            node = tree
+            for move in moves:
+                node = node.setdefault(move, {})
+            node.setdefault(None, []).append(i)
+        return tree
+
+    def evaluate_moves(self, candidates):
+        """Function to check many sequences of moves at once
+
+        Sequences sharing a prefix are only simulated once, by walking the
+        candidates as a tree of moves. Legality follows `is_legal`, and
+        reaching the apple follows `is_winning`.
+
+        Args:
+            candidates: Either a list of move sequences, or a tree of moves
+                given as nested dicts, like {'up': {'left': {}, 'up': {}}}
+
+        Returns:
+            A list with a MoveEvaluation for each sequence, or for a tree a
+            dict mapping the moves to each leaf to its MoveEvaluation.
+
+            MoveEvaluation.legal: True if all the moves are legal
+            MoveEvaluation.apple_step: Index of the move reaching the
+                apple, or None
+            MoveEvaluation.fail_step: Index of the first move ending in a
+                loss-condition, or None
+        """
+        tree = self._build_move_tree(candidates)
+        results = {}
+
+        # Cells entered during the simulation, see is_legal
+        visited = {}
+        missing = object()
+
+        x, y = self.snake[-1]
+        length = len(self.snake)
+        head_seq = self.head_seq
+        stack = [(tree, None, x, y, length, head_seq - length + 1, head_seq,
+                  0, None, None, True)]
+        while stack:
+            item = stack.pop()
+            if item[0] is None:
+                # Leaving a node, restore the cell it entered
+                _, cell, seq = item
+                if seq is missing:
+                    del visited[cell]
+                else:
+                    visited[cell] = seq
+                continue
+
+            node, cell, x, y, length, tail_seq, head_seq, step, \
+                fail_step, apple_step, tracking = item
+            if cell is not None:
+                stack.append((None, cell, visited.get(cell, missing)))
+                visited[cell] = head_seq
+
+            for move, child in node.items():
+                if move is None:
+                    evaluation = MoveEvaluation(fail_step is None, apple_step, fail_step)
+                    for key in child:
+                        results[key] = evaluation
+                    continue
+
+                if move not in directions:
+                    # Illegal move?
+                    stack.append((child, None, x, y, length, tail_seq, head_seq, step + 1,
+                                  step if fail_step is None else fail_step,
+                                  apple_step, False))
+                    continue
+
+                d_x, d_y = directions[move]
+                c_x, c_y = x + d_x, y + d_y
+                c_length, c_tail_seq = length, tail_seq
+                if length < self.snake_len:
+                    c_length += 1
+                else:
+                    c_tail_seq += 1
+
+                c_apple_step = apple_step
+                if tracking and apple_step is None and (c_x, c_y) == self.apple:
+                    c_apple_step = step
+
+                c_fail_step, c_cell = fail_step, None
+                if fail_step is None:
+                    seq = visited.get((c_x, c_y), self.snake_cells.get((c_x, c_y)))
+                    if (c_x < 0 or c_x >= self.width) or (c_y < 0 or c_y >= self.height) or \
+                            (seq is not None and seq >= c_tail_seq):
+                        c_fail_step = step
+                    else:
+                        c_cell = (c_x, c_y)
+
+                stack.append((child, c_cell, c_x, c_y, c_length, c_tail_seq, head_seq + 1,
+                              step + 1, c_fail_step, c_apple_step, tracking))
+
+        if isinstance(candidates, dict):
+            return results
+        return [results[i] for i in range(len(candidates))]
+
+    def _get_free_mask(self):
+        """Helper function to get a mask of the cells the snake can move to"""
+        return (self.game_state == states['board']) | \
+               (self.game_state == states['apple'])
+
+    def get_distance_field(self, target=None):
+        """Function to get the shortest distance from a target to every cell
+
+        The snake body is treated as obstacles. Distance fields are cached
+        until the game state changes, so repeated queries within a tick are
+        free.
+
+        Args:
+            target: Position to measure distances from. Defaults to the apple
+
+        Returns:
+            np.ndarray: Read-only 2D array of distances, -1 for unreachable
+                cells. None if there is no apple to measure from.
+        """
+        if target is None:
+            target = self.apple
+            if target is None:
+                return None
+        target = tuple(target)
+
+        if self.distance_fields_version != self.state_version:
+            self.distance_fields = {}
+            self.distance_fields_version = self.state_version
+
+        field = self.distance_fields.get(target)
+        if field is None:
+            field = pathfinding.distance_field(self._get_free_mask(), target)
+            field.flags.writeable = False
+            self.distance_fields[target] = field
+        return field
+
+    def path_to(self, target=None):
+        """Function to find the shortest path from the snake head to a target
+
+        The snake body is treated as obstacles.
+
+        Args:
+            target: Position to find a path to. Defaults to the apple
+
+        Returns:
+            list: The moves leading to the target, None if it is unreachable
+        """
+        field = self.get_distance_field(target)
+        if field is None:
+            return None
+        return pathfinding.follow_field(field, self.snake[-1])
+
+    def distance(self, p, q):
+        """Function to get the shortest distance between two positions
+
+        Unlike `get_distance`, the snake body is treated as obstacles.
+
+        Returns:
+            int: Number of moves from p to q, None if q is unreachable or
+                there is no apple to measure to
+        """
+        field = self.get_distance_field(q)
+        if field is None:
+            return None
+        return pathfinding.distance_from_field(field, tuple(p))
+
+    def get_regions(self):
+        """Function to label the connected regions of free cells
+
+        The labels are cached until the game state changes.
+
+        Returns:
+            tuple: Read-only 2D array with the region id of every position
+                ( -1 for the snake ), and an array with the size of each
+                region
+        """
+        if self.regions_version != self.state_version:
+            labels, sizes = pathfinding.label_regions(self._get_free_mask())
+            labels.flags.writeable = False
+            sizes.flags.writeable = False
+            self.regions = (labels, sizes)
+            self.regions_version = self.state_version
+        return self.regions
+
+    def region_sizes(self):
+        """Returns the sizes of all regions of free cells, largest first"""
+        return sorted(self.get_regions()[1].tolist(), reverse=True)
+
+    def reachable_area(self, pos):
+        """Function to get the number of free cells reachable from a position
+
+        If the position is part of the snake ( like the head ), the regions
+        next to it are counted instead. Positions outside the board have no
+        reachable area.
+
+        Returns:
+            int: Number of reachable free cells
+        """
+        if not (0 <= pos[0] < self.width and 0 <= pos[1] < self.height):
+            return 0
+        labels, sizes = self.get_regions()
+        pos = tuple(pos)
+        if labels[pos] >= 0:
+            return int(sizes[labels[pos]])
+
+        neighbours = {labels[n] for _, n in pathfinding.get_neighbours(labels, pos)}
+        return int(sum(sizes[label] for label in neighbours if label >= 0))
+
+    def simulate_move(self, pos, move):
+        """Simulates a move from the given position, and returns the new position"""
+        new_pos = list(pos)
+        if move == 'up':
+            new_pos[1] += -1
+        elif move == 'down':
+            new_pos[1] += 1
+        elif move == 'left':
+            new_pos[0] += -1
+        elif move == 'right':
+            new_pos[0] += 1
+        else:
+            raise ValueError(f'Invalid Move \'{move}\'')
+        return new_pos
+
+    def get_snake_head_position(self):
+        """Returns the current position og the snake head in the game state"""
+        return list(self.snake[-1])
+
+    def get_apple_position(self):
+        """Returns the current position of the apple in the game state"""
+        return list(self.apple) if self.apple else []
+
+    def get_distance(self, p, q):
+        """Calculates distance between two points"""
+        return abs(p[0] - q[0]) + abs(p[1] - q[1])
+
+    def snapshot(self):
+        """Returns an independent, headless copy of the current game
+
+        The copy shares no mutable state with the game, including the random
+        generator, so it can be stepped ( for example by a planner running in
+        another thread ) without affecting the game itself.
+        """
+        game = object.__new__(SnakeEngine)
+        game.__dict__.update(self.__dict__)
+        game.snake = self.snake.copy()
+        game.snake_cells = self.snake_cells.copy()
+        game.game_state = self.game_state.copy()
+        game.free_cells = self.free_cells.copy()
+        game.free_slot = self.free_slot.copy()
+        game.rng = random.Random()
+        game.rng.setstate(self.rng.getstate())
+        game.moves = list(self.moves)
+        game.distance_fields = {}
+        game.distance_fields_version = None
+        game.record = False
+        game.recorded_moves = None
+        game.recorded_apples = None
+        return game
+
+    def register_ai(self, f):
+        """Decorator for registering 'external' AI"""
+        self.ai = f
@@ -0,0 +1,125 @@
+import numpy as np
+
+from utils import directions
+
+
+def distance_field(free, source):
+    """Calculates the shortest distance from source to every cell
+
+    The distances are found with a breadth-first wavefront, where the whole
+    frontier is expanded by one step at a time with NumPy shifts.
+
+    Args:
+        free: 2D boolean array, True for cells that can be moved through
+        source: Position (x, y) to measure distances from. The source does
+            not need to be free
+
+    Returns:
+        np.ndarray: 2D array of distances, -1 for unreachable cells
+    """
+    dist = np.full(free.shape, -1, dtype=np.int32)
+    frontier = np.zeros(free.shape, dtype=bool)
+    frontier[source] = True
+    seen = frontier.copy()
+    dist[source] = 0
+
+    step = 0
+    while frontier.any():
+        step += 1
+        expanded = np.zeros_like(frontier)
+        expanded[1:, :] |= frontier[:-1, :]
+        expanded[:-1, :] |= frontier[1:, :]
+        expanded[:, 1:] |= frontier[:, :-1]
+        expanded[:, :-1] |= frontier[:, 1:]
+        frontier = expanded & free & ~seen
+        seen |= frontier
+        dist[frontier] = step
+    return dist
+
+
+def get_neighbours(field, pos):
+    """Yields (move, neighbour) for every neighbour of pos inside the field"""
+    width, height = field.shape
+    for move, (d_x, d_y) in directions.items():
+        x, y = pos[0] + d_x, pos[1] + d_y
+        if 0 <= x < width and 0 <= y < height:
+            yield move, (x, y)
+
+
+def distance_from_field(field, pos):
+    """Returns the distance of pos in a distance field, None if unreachable
+
+    If pos itself is blocked ( like the snake head ) the distance is found
+    through its closest free neighbour.
+    """
+    if field[pos] >= 0:
+        return int(field[pos])
+    steps = [field[n] for _, n in get_neighbours(field, pos) if field[n] >= 0]
+    if not steps:
+        return None
+    return int(min(steps)) + 1
+
+
+def follow_field(field, start):
+    """Follows a distance field downhill from start to its source
+
+    Returns:
+        list: Moves leading from start to the source, None if unreachable
+    """
+    if distance_from_field(field, start) is None:
+        return None
+
+    moves = []
+    pos = tuple(start)
+    while field[pos] != 0:
+        best = None
+        for move, neighbour in get_neighbours(field, pos):
+            if field[neighbour] >= 0 and (best is None or field[neighbour] < field[best[1]]):
+                best = (move, neighbour)
+        moves.append(best[0])
+        pos = best[1]
+    return moves
+
+
+def label_regions(free):
+    """Labels the connected regions of free cells
+
+    Every free cell starts out labelled with its own flat index. Each pass
+    takes the smallest label among the neighbours, and then jumps every
+    label to the label of the cell it points to, so the number of passes
+    grows with the log of the region size rather than with its diameter.
+
+    Args:
+        free: 2D boolean array, True for cells that can be moved through
+
+    Returns:
+        tuple: 2D array of region ids ( -1 for blocked cells ), and an array
+            with the size of each region
+    """
+    n = free.size
+    blocked = ~free
+    # One extra label, n, for blocked cells, which always points to itself
+    labels = np.append(np.where(free.ravel(), np.arange(n), n), n)
+
+    while True:
+        grid = labels[:n].reshape(free.shape)
+        smallest = grid.copy()
+        np.minimum(smallest[1:, :], grid[:-1, :], out=smallest[1:, :])
+        np.minimum(smallest[:-1, :], grid[1:, :], out=smallest[:-1, :])
+        np.minimum(smallest[:, 1:], grid[:, :-1], out=smallest[:, 1:])
+        np.minimum(smallest[:, :-1], grid[:, 1:], out=smallest[:, :-1])
+        smallest[blocked] = n
+
+        jumped = np.append(smallest.ravel(), n)
+        jumped = jumped[jumped]
+        if np.array_equal(jumped, labels):
+            break
+        labels = jumped
+
+    roots, regions = np.unique(labels[:n], return_inverse=True)
+    sizes = np.bincount(regions)
+    if len(roots) and roots[-1] == n:
+        # Drop the label of the blocked cells
+        regions[labels[:n] == n] = -1
+        sizes = sizes[:-1]
+    return regions.reshape(free.shape), sizes
@@ -0,0 +1,149 @@
+"""Compact binary replays of snake games
+
+A replay stores a header with the board size, start length and seed,
+followed by every effective move packed as 2 bits, and every apple spawn as
+a flat cell index ( `x * height + y` ). No frames are stored, any tick is
+rebuilt by fast-forwarding the headless engine.
+
+Example:
+    game = SnakeEngine(15, 15, seed=42, record=True)
+    ...
+    replay.save(game, 'game.snkr')
+
+    player = replay.ReplayPlayer(replay.load('game.snkr'))
+    game = player.seek(120)  # The game after 120 moves
+"""
+import struct
+from collections import namedtuple
+
+from engine import SnakeEngine
+from utils import directions
+
+MAGIC = b'SNKR'
+VERSION = 1
+
+# magic, version, width, height, start length, seed, moves, apples
+HEADER = struct.Struct('<4sBHHHQII')
+NO_APPLE = 0xFFFFFFFF
+
+move_names = list(directions)
+delta_index = {delta: i for i, delta in enumerate(directions.values())}
+
+Replay = namedtuple('Replay', ['width', 'height', 'start_len', 'seed', 'moves', 'apples'])
+
+
+def _cell_format(width, height):
+    """Helper function to get the struct format of a single apple cell"""
+    return 'H' if width * height < 0xFFFF else 'I'
+
+
+def from_engine(game):
+    """Creates a Replay of a game played with `record=True`"""
+    if not game.record:
+        raise ValueError('The game was not recorded, create it with record=True')
+    moves = [move_names[delta_index[delta]] for delta in game.recorded_moves]
+    return Replay(game.width, game.height, game.start_len, game.seed,
+                  moves, list(game.recorded_apples))
+
+
+def encode(replay):
+    """Encodes a Replay into bytes"""
+    data = bytearray(HEADER.pack(MAGIC, VERSION, replay.width, replay.height,
+                                 replay.start_len, replay.seed,
+                                 len(replay.moves), len(replay.apples)))
+
+    # Four moves per byte, the first move in the lowest bits
+    packed = bytearray((len(replay.moves) + 3) // 4)
+    for i, move in enumerate(replay.moves):
+        packed[i >> 2] |= move_names.index(move) << ((i & 3) << 1)
+    data += packed
+
+    no_apple = 0xFFFF if _cell_format(replay.width, replay.height) == 'H' else NO_APPLE
+    cells = [no_apple if apple is None else apple[0] * replay.height + apple[1]
+             for apple in replay.apples]
+    data += struct.pack(f'<{len(cells)}{_cell_format(replay.width, replay.height)}', *cells)
+    return bytes(data)
+
+
+def decode(data):
+    """Decodes bytes into a Replay"""
+    magic, version, width, height, start_len, seed, n_moves, n_apples = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a snake replay')
+    if version != VERSION:
+        raise ValueError(f'Unsupported replay version {version}')
+
+    offset = HEADER.size
+    packed = data[offset:offset + (n_moves + 3) // 4]
+    moves = [move_names[(packed[i >> 2] >> ((i & 3) << 1)) & 3] for i in range(n_moves)]
+    offset += len(packed)
+
+    cell_format = _cell_format(width, height)
+    no_apple = 0xFFFF if cell_format == 'H' else NO_APPLE
+    cells = struct.unpack_from(f'<{n_apples}{cell_format}', data, offset)
+    apples = [None if cell == no_apple else (cell // height, cell % height)
+              for cell in cells]
+    return Replay(width, height, start_len, seed, moves, apples)
+
+
+def save(game, path):
+    """Writes a recorded game to a replay file"""
+    with open(path, 'wb') as f:
+        f.write(encode(from_engine(game)))
+
+
+def load(path):
+    """Reads a Replay from a replay file"""
+    with open(path, 'rb') as f:
+        return decode(f.read())
+
+
+class ReplayEngine(SnakeEngine):
+    """SnakeEngine that takes its apple spawns from a replay
+
+    Apples are taken from the replay rather than drawn from the seed, so
+    replays stay valid even if the way apples are drawn changes.
+    """
+    def __init__(self, replay):
+        self.replay = replay
+        super().__init__(replay.width, replay.height, replay.start_len, seed=replay.seed)
+
+    def reset(self, seed=None):
+        """Resets the engine to the start of the replay"""
+        self.replay_apples = iter(self.replay.apples)
+        super().reset(self.replay.seed)
+
+    def _get_random_position(self):
+        """Helper function to take the next apple position from the replay"""
+        return next(self.replay_apples, None)
+
+
+class ReplayPlayer:
+    """Rebuilds the game at any point of a replay"""
+    def __init__(self, replay):
+        self.replay = replay
+        self.game = None
+        self.position = 0
+
+    def __len__(self):
+        return len(self.replay.moves)
+
+    def seek(self, position):
+        """Fast-forwards the headless engine to the game after `position` moves
+
+        Seeking forward continues from the current game, seeking backwards
+        starts over from the first move.
+
+        Returns:
+            SnakeEngine: The game at the given position
+        """
+        position = max(0, min(position, len(self)))
+        if self.game is None or position < self.position:
+            self.game = ReplayEngine(self.replay)
+            self.position = 0
+
+        for move in self.replay.moves[self.position:position]:
+            self.game.step(move)
+        self.position = position
+        return self.game
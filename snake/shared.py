@@ -0,0 +1,245 @@
+"""Shared memory channel between a snake game and out-of-process agents
+
+The game publishes its state into a `multiprocessing.shared_memory` block
+( Python 3.8+ ) every tick, and agents in other processes read it through
+NumPy views without any pickling. The block holds:
+
+    header: int64 fields, see the constants below
+    grid:   (width, height) int8 game state, same values as `states`
+    body:   (width * height) int32 ring buffer of flat body cells
+            ( `x * height + y` ), the head at `head_seq % (width * height)`
+
+The header field SEQ works as a sequence lock: it is odd while the game is
+writing, and increased to the next even number once the state is complete.
+Agents answer by writing a move index into COMMAND_MOVE, followed by the
+SEQ they answer into COMMAND_SEQ.
+
+Example:
+    # Game process
+    channel = SharedGameWriter(snake)
+    snake.register_ai(channel.remote_ai())
+
+    # Agent process
+    reader = SharedGameReader(name)
+    while True:
+        state = reader.wait_for_update()
+        reader.send_move('left')
+"""
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import states
+from utils import directions
+
+SEQ = 0
+WIDTH = 1
+HEIGHT = 2
+HEAD_X = 3
+HEAD_Y = 4
+APPLE_X = 5
+APPLE_Y = 6
+HEAD_SEQ = 7
+LENGTH = 8
+RUNNING = 9
+WON = 10
+TICKS = 11
+COMMAND_SEQ = 12
+COMMAND_MOVE = 13
+HEADER_FIELDS = 16
+
+move_names = list(directions)
+
+
+def _block_size(width, height):
+    """Helper function to get the size in bytes of a shared block"""
+    return HEADER_FIELDS * 8 + width * height * (1 + 4)
+
+
+def _views(buffer, width, height):
+    """Helper function to create the header, grid and body views of a block"""
+    header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+    offset = HEADER_FIELDS * 8
+    body = np.ndarray((width * height,), dtype=np.int32, buffer=buffer, offset=offset)
+    offset += width * height * 4
+    grid = np.ndarray((width, height), dtype=np.int8, buffer=buffer, offset=offset)
+    return header, grid, body
+
+
+class SharedGameWriter:
+    """Publishes a game into shared memory"""
+    def __init__(self, game, name=None):
+        self.game = game
+        self.memory = shared_memory.SharedMemory(
+            name=name, create=True, size=_block_size(game.width, game.height))
+        self.name = self.memory.name
+        self.header, self.grid, self.body = _views(self.memory.buf, game.width, game.height)
+
+        self.header[:] = 0
+        self.header[WIDTH] = game.width
+        self.header[HEIGHT] = game.height
+        self.header[COMMAND_SEQ] = -1
+
+        self.published_version = None
+        self.published_head_seq = None
+        self.published_apple = None
+        self.publish()
+
+    def _write_all(self):
+        """Helper function to write the whole grid and body"""
+        game = self.game
+        self.grid[:] = game.game_state
+        cells = len(self.body)
+        for i, (x, y) in enumerate(reversed(game.snake)):
+            self.body[(game.head_seq - i) % cells] = x * game.height + y
+
+    def _write_move(self):
+        """Helper function to write only the cells changed by a single move"""
+        game = self.game
+        if game.dropped_tail:
+            self.grid[game.dropped_tail] = states['board']
+        if len(game.snake) > 1:
+            self.grid[game.snake[-2]] = states['snake_body']
+        x, y = game.snake[-1]
+        self.grid[x, y] = states['snake_head']
+        self.body[game.head_seq % len(self.body)] = x * game.height + y
+        if game.apple and game.apple != self.published_apple:
+            self.grid[game.apple] = states['apple']
+
+    def publish(self):
+        """Writes the current state of the game into shared memory
+
+        After a single move only the changed cells are written. A move that
+        ends the game without being applied ( into a wall or the body ) is
+        not published, the last state is kept with the game marked as over.
+        """
+        game = self.game
+        header = self.header
+        header[SEQ] += 1
+
+        if self.published_version != game.state_version or \
+                self.published_head_seq == game.head_seq:
+            if game.is_running and self.published_version == game.state_version - 1 and \
+                    self.published_head_seq == game.head_seq - 1:
+                self._write_move()
+            elif self.published_version != game.state_version:
+                self._write_all()
+
+            header[HEAD_X], header[HEAD_Y] = game.snake[-1]
+            header[APPLE_X], header[APPLE_Y] = game.apple if game.apple else (-1, -1)
+            header[HEAD_SEQ] = game.head_seq
+            header[LENGTH] = len(game.snake)
+            self.published_version = game.state_version
+            self.published_head_seq = game.head_seq
+            self.published_apple = game.apple
+
+        header[RUNNING] = game.is_running
+        header[WON] = game.won
+        header[TICKS] = game.ticks
+        header[SEQ] += 1
+
+    def wait_for_move(self, timeout=None):
+        """Waits for an agent to answer the latest published state
+
+        Returns:
+            str: The move, None if the timeout ran out
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        seq = self.header[SEQ]
+        while self.header[COMMAND_SEQ] != seq:
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            time.sleep(0)
+        return move_names[self.header[COMMAND_MOVE]]
+
+    def remote_ai(self, timeout=None):
+        """Returns an AI function that publishes the game and waits for an agent
+
+        Register the result with `register_ai`. If the agent does not answer
+        within the timeout, the current direction is kept.
+        """
+        def ai():
+            self.publish()
+            move = self.wait_for_move(timeout)
+            if move is None:
+                return [self.game.current_move() or 'down']
+            return [move]
+        return ai
+
+    def close(self):
+        """Releases and removes the shared memory block"""
+        self.header = self.grid = self.body = None
+        self.memory.close()
+        self.memory.unlink()
+
+
+class SharedGameReader:
+    """Reads a game published by SharedGameWriter, from any process
+
+    `header`, `grid` and `body` are zero-copy views into shared memory. Use
+    `read` for a consistent copy of the state.
+    """
+    def __init__(self, name):
+        self.memory = shared_memory.SharedMemory(name=name)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.memory.buf)
+        self.width = int(header[WIDTH])
+        self.height = int(header[HEIGHT])
+        self.header, self.grid, self.body = _views(self.memory.buf, self.width, self.height)
+        self.seen_seq = None
+
+    def read(self):
+        """Returns a consistent copy of the latest published state
+
+        Returns:
+            dict: seq, head, apple, length, running, won, ticks, grid and the
+                body as a list of flat cells, tail first
+        """
+        while True:
+            seq = self.header[SEQ]
+            if seq % 2:
+                time.sleep(0)
+                continue
+            header = self.header.copy()
+            grid = self.grid.copy()
+            length = int(header[LENGTH])
+            ring = (int(header[HEAD_SEQ]) - np.arange(length - 1, -1, -1)) % len(self.body)
+            body = self.body[ring]
+            if self.header[SEQ] == seq:
+                break
+
+        self.seen_seq = int(seq)
+        return {
+            'seq': int(seq),
+            'head': (int(header[HEAD_X]), int(header[HEAD_Y])),
+            'apple': None if header[APPLE_X] < 0 else (int(header[APPLE_X]), int(header[APPLE_Y])),
+            'length': length,
+            'running': bool(header[RUNNING]),
+            'won': bool(header[WON]),
+            'ticks': int(header[TICKS]),
+            'grid': grid,
+            'body': body,
+        }
+
+    def wait_for_update(self, timeout=None):
+        """Waits until a state newer than the last one read is published
+
+        Returns:
+            dict: The state, see `read`. None if the timeout ran out
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.header[SEQ] == self.seen_seq or self.header[SEQ] % 2:
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            time.sleep(0)
+        return self.read()
+
+    def send_move(self, move, seq=None):
+        """Answers the state with the given seq ( the last one read ) with a move"""
+        self.header[COMMAND_MOVE] = move_names.index(move)
+        self.header[COMMAND_SEQ] = self.seen_seq if seq is None else seq
+
+    def close(self):
+        """Detaches from the shared memory block"""
+        self.header = self.grid = self.body = None
+        self.memory.close()
@@ -1,11 +1,10 @@
-import random
 import sys
 import time
 import pygame
-import numpy as np
 
 import utils
 import config
+from engine import SnakeEngine
 
 pygame.init()
 
@@ -18,38 +17,27 @@ colors = {
     'white': (255, 255, 255),
 }
 
-states = {
-    'board': 0,
-    'snake_body': 1,
-    'snake_head': 2,
-    'apple': 3
-}
-
 
-class SnakeGame:
+class SnakeGame(SnakeEngine):
     def __init__(self):
+        self.drawn_head_seq = None
+        self.drawn_len = None
         self.font_style = pygame.font.SysFont(None, 50)
 
-        self.width = config.WIDTH
-        self.height = config.HEIGHT
-        self.display = pygame.display.set_mode((self.width, self.height))
+        self.display_width = config.WIDTH
+        self.display_height = config.HEIGHT
+        self.display = pygame.display.set_mode((self.display_width,
+                                                self.display_height))
         pygame.display.set_caption('Snake')
 
         self.clock = pygame.time.Clock()
 
-        self.snake = None
-        self.apple = None
-
-        self.snake_delta_x = 0
-        self.snake_delta_y = 0
-
-        self.snake_len = config.SNAKE_START_LEN
         self.sprite_size = utils.find_common_divisor(config.WIDTH,
                                                      config.HEIGHT,
                                                      config.MAX_SPRITE_SIZE,
                                                      config.MIN_SPRITE_SIZE)
         if not self.sprite_size:
-            self._game_over(msg=f'Invalid game size {self.width}x{self.height}')
+            self._game_over(msg=f'Invalid game size {self.display_width}x{self.display_height}')
 
         self.sprites = {
             'apple': pygame.image.load('gfx/apple.png').convert_alpha(),
@@ -58,24 +46,23 @@ class SnakeGame:
             'straight': pygame.image.load('gfx/straight.png').convert_alpha(),
             'tail': pygame.image.load('gfx/tail.png').convert_alpha()
         }
+        self.sprite_atlas = self._build_sprite_atlas()
 
-        self._update_game_state()
-
-        self.moves = []
-        self.ai = lambda placeholder: self._game_over(msg='No AI registered!')
+        super().__init__(self.display_width // self.sprite_size,
+                         self.display_height // self.sprite_size)
 
     def _display_message(self, msg, color=colors['blue']):
         """Helper function to show message on display"""
         message = self.font_style.render(msg, True, color)
         message_rect = message.get_rect(
-            center=(self.width / 2, self.height / 2))
+            center=(self.display_width / 2, self.display_height / 2))
 
         self.display.blit(message, message_rect)
         pygame.display.update()
         time.sleep(1)
 
     def _load_image(self, sprite_name, color_key=None):
-        """Helper function to load image from disk"""
+        """Helper function to load a sprite scaled to the sprite size"""
         image = self.sprites[sprite_name]
         image = pygame.transform.scale(image,
                                        (self.sprite_size, self.sprite_size))
@@ -83,104 +70,100 @@ class SnakeGame:
             image.set_colorkey(color_key)
         return image
 
+    def _build_sprite_atlas(self):
+        """Helper function to scale and rotate every sprite once
+
+        The atlas maps (sprite, orientation) to a ready-to-blit image. Head
+        and tail are keyed by the direction the snake moves in, straight
+        segments by 'horizontal' / 'vertical' and bends by the two sides
+        they connect.
+        """
+        rotations = {'up': 0, 'right': 270, 'down': 180, 'left': 90}
+        atlas = {('apple', None): self._load_image('apple')}
+
+        for name in ('head', 'tail'):
+            image = self._load_image(name)
+            for direction, angle in rotations.items():
+                atlas[(name, direction)] = pygame.transform.rotate(image, angle)
+
+        image = self._load_image('straight')
+        atlas[('straight', 'horizontal')] = image
+        atlas[('straight', 'vertical')] = pygame.transform.rotate(image, 90)
+
+        image = self._load_image('bend')
+        bends = {0: ('right', 'up'), 90: ('left', 'up'),
+                 180: ('down', 'left'), 270: ('down', 'right')}
+        for angle, sides in bends.items():
+            atlas[('bend', sides)] = pygame.transform.rotate(image, angle)
+
+        return atlas
+
+    def _get_direction(self, p, q):
+        """Helper function to get the direction of the step from p to q"""
+        if q[1] < p[1]:
+            return 'up'
+        if q[0] > p[0]:
+            return 'right'
+        if q[1] > p[1]:
+            return 'down'
+        if q[0] < p[0]:
+            return 'left'
+        return None
+
+    def _get_segment_image(self, i, snake):
+        """Helper function to look up the sprite of segment `i` in `snake`
+
+        Returns None if no sprite fits the segment
+        """
+        if i == len(snake) - 1:
+            # Snake head, rotated after the direction it is moving
+            return self.sprite_atlas.get(
+                ('head', self._get_direction(snake[i - 1], snake[i])))
+
+        if i == 0:
+            # Snake tail, rotated after the direction it is moving
+            return self.sprite_atlas.get(
+                ('tail', self._get_direction(snake[0], snake[1])))
+
+        # Body segment, given by the sides connecting it to its neighbours
+        sides = tuple(sorted((self._get_direction(snake[i], snake[i - 1]),
+                              self._get_direction(snake[i], snake[i + 1]))))
+        if sides == ('left', 'right'):
+            return self.sprite_atlas[('straight', 'horizontal')]
+        if sides == ('down', 'up'):
+            return self.sprite_atlas[('straight', 'vertical')]
+        return self.sprite_atlas.get(('bend', sides))
+
+    def _draw_segment(self, i, snake=None):
+        """Helper function to draw a single snake segment on display
+
+        Segments are looked up by index, so pass a list as `snake` when
+        drawing segments away from the ends of the snake.
+        """
+        if snake is None:
+            snake = self.snake
+        seg = snake[i]
+        image = self._get_segment_image(i, snake)
+        if image is None:
+            # Failsafe - probably won't happen
+            pygame.draw.rect(self.display, colors['green'],
+                             [*self._to_pixels(seg), self.sprite_size,
+                              self.sprite_size])
+            return
+        self.display.blit(image, self._to_pixels(seg))
+
     def _draw_snake(self):
         """Helper function to draw snake on display"""
-        # Determine correct image for snake head
-        snake_head = self.snake[-1]
-        if snake_head[1] < self.snake[-2][1]:
-            # Moving Up
-            image = self._load_image('head')
-
-        elif snake_head[0] > self.snake[-2][0]:
-            # Moving right
-            image = self._load_image('head')
-            image = pygame.transform.rotate(image, 270)
-
-        elif snake_head[1] > self.snake[-2][1]:
-            # Moving down
-            image = self._load_image('head')
-            image = pygame.transform.rotate(image, 180)
-
-        elif snake_head[0] < self.snake[-2][0]:
-            # Moving left
-            image = self._load_image('head')
-            image = pygame.transform.rotate(image, 90)
-
-        self.display.blit(image, snake_head)
-
-        # Determine correct image for snake tail
-        snake_tail = self.snake[0]
-        if snake_tail[1] > self.snake[1][1]:
-            # Moving Up
-            image = self._load_image('tail')
-
-        elif snake_tail[0] < self.snake[1][0]:
-            # Moving right
-            image = self._load_image('tail')
-            image = pygame.transform.rotate(image, 270)
-
-        elif snake_tail[1] < self.snake[1][1]:
-            # Moving down
-            image = self._load_image('tail')
-            image = pygame.transform.rotate(image, 180)
-
-        elif snake_tail[0] > self.snake[1][0]:
-            # Moving left
-            image = self._load_image('tail')
-            image = pygame.transform.rotate(image, 90)
-
-        self.display.blit(image, snake_tail)
-
-        # Determine correct image for the body
-        for i, seg in enumerate(self.snake[1:-1], 1):
-            p_seg = self.snake[i + 1]
-            n_seg = self.snake[i - 1]
-
-            if n_seg[0] < seg[0] < p_seg[0] or p_seg[0] < seg[0] < n_seg[0]:
-                # Horizontal segment
-                image = self._load_image('straight')
-
-            elif n_seg[1] < seg[1] < p_seg[1] or p_seg[1] < seg[1] < n_seg[1]:
-                # Vertical segment
-                image = self._load_image('straight')
-                image = pygame.transform.rotate(image, 90)
-
-            elif (n_seg[0] > seg[0] and p_seg[1] < seg[1]) or \
-                    (p_seg[0] > seg[0] and n_seg[1] < seg[1]):
-                # Angle Left-Up
-                image = self._load_image('bend')
-
-            elif (n_seg[1] < seg[1] and p_seg[0] < seg[0]) or \
-                    (p_seg[1] < seg[1] and n_seg[0] < seg[0]):
-                # Angle Top-Left
-                image = self._load_image('bend')
-                image = pygame.transform.rotate(image, 90)
-
-            elif (n_seg[0] < seg[0] and p_seg[1] > seg[1]) or \
-                    (p_seg[0] < seg[0] and n_seg[1] > seg[1]):
-                # Angle Left-Down
-                image = self._load_image('bend')
-                image = pygame.transform.rotate(image, 180)
-
-            elif (n_seg[1] > seg[1] and p_seg[0] > seg[0]) or \
-                    (p_seg[1] > seg[1] and n_seg[0] > seg[0]):
-                # Angle Down-Right
-                image = self._load_image('bend')
-                image = pygame.transform.rotate(image, 270)
-
-            else:
-                # Failsafe - probably won't happen
-                pygame.draw.rect(self.display, colors['green'],
-                                 [seg[0], seg[1], self.sprite_size,
-                                  self.sprite_size])
-                return
-
-            self.display.blit(image, seg)
+        snake = list(self.snake)
+        for i in range(len(snake)):
+            self._draw_segment(i, snake)
 
     def _draw_apple(self):
         """Helper function to draw apple on display"""
-        image = self._load_image('apple')
-        self.display.blit(image, self.apple)
+        if self.apple is None:
+            return
+        image = self.sprite_atlas[('apple', None)]
+        self.display.blit(image, self._to_pixels(self.apple))
 
     def _update_display(self):
         """Helper function to update pygame display"""
@@ -188,43 +171,67 @@ class SnakeGame:
         self._draw_apple()
         self._draw_snake()
         pygame.display.update()
-        self._update_game_state()
-
-    def _set_direction(self, direction):
-        """Helper function to set snake direction delta"""
-        if direction == 'up' and self.snake_delta_y != self.sprite_size and \
-                not self._is_stationary():
-            self.snake_delta_y = -self.sprite_size
-            self.snake_delta_x = 0
-        elif direction == 'down' and self.snake_delta_y != -self.sprite_size:
-            self.snake_delta_y = self.sprite_size
-            self.snake_delta_x = 0
-        elif direction == 'left' and self.snake_delta_x != self.sprite_size:
-            self.snake_delta_x = -self.sprite_size
-            self.snake_delta_y = 0
-        elif direction == 'right' and self.snake_delta_x != -self.sprite_size:
-            self.snake_delta_x = self.sprite_size
-            self.snake_delta_y = 0
-        else:
-            # Unknown move - do nothing
-            pass
-
-    def _is_stationary(self):
-        """Helper function to check if snake is standing still"""
-        if self.snake_delta_x == 0 and self.snake_delta_y == 0:
-            return True
-        else:
-            return False
-
-    def _move_snake(self):
-        """Helper function to move snake position"""
-        snake_head = self.snake[-1].copy()
-        snake_head[0] += self.snake_delta_x
-        snake_head[1] += self.snake_delta_y
-        self.snake.append(snake_head)
-
-        if len(self.snake) > self.snake_len:
-            del self.snake[0]
+        self._set_drawn()
+
+    def _get_cell_rect(self, pos):
+        """Helper function to get the display rect of a game state position"""
+        return pygame.Rect(self._to_pixels(pos),
+                           (self.sprite_size, self.sprite_size))
+
+    def _update_changed_cells(self):
+        """Helper function to redraw only the cells changed by the last move
+
+        A move only changes the new head, the previous head, the new tail,
+        the dropped tail and the apple. These cells are cleared, redrawn and
+        passed on as the only rects to update on the display.
+        """
+        if self.snake[-1] == self.drawn_head:
+            return
+
+        rects = []
+        if self.dropped_tail:
+            rect = self._get_cell_rect(self.dropped_tail)
+            self.display.fill(colors['white'], rect)
+            rects.append(rect)
+
+        for i in {0, len(self.snake) - 2, len(self.snake) - 1}:
+            if i < 0:
+                continue
+            rect = self._get_cell_rect(self.snake[i])
+            self.display.fill(colors['white'], rect)
+            self._draw_segment(i)
+            rects.append(rect)
+
+        if self.apple and self.apple != self.drawn_apple:
+            rect = self._get_cell_rect(self.apple)
+            self.display.fill(colors['white'], rect)
+            self._draw_apple()
+            rects.append(rect)
+
+        pygame.display.update(rects)
+        self._set_drawn()
+
+    def _set_drawn(self):
+        """Helper function to remember the state shown on display"""
+        self.drawn_head = self.snake[-1]
+        self.drawn_head_seq = self.head_seq
+        self.drawn_apple = self.apple
+        self.drawn_len = self.snake_len
+
+    def _render(self):
+        """Helper function to bring the display up to date with the game
+
+        A single move since the last frame only redraws the changed cells,
+        after skipped frames the whole display is redrawn.
+        """
+        if self.drawn_head_seq == self.head_seq - 1:
+            self._update_changed_cells()
+        elif self.drawn_head_seq != self.head_seq:
+            self._update_display()
+
+    def _to_pixels(self, pos):
+        """Helper function to convert a game state position to pixels"""
+        return (pos[0] * self.sprite_size, pos[1] * self.sprite_size)
 
     def _check_move_event(self, event):
         """Helper function to extract move from user keyboard input"""
@@ -246,63 +253,19 @@ class SnakeGame:
             if event.key == pygame.K_q:
                 self._game_over(msg='Quitting...')
 
-    def _check_if_apple_eaten(self):
-        """Helper function to check if snake has eaten the apple"""
-        if self.snake[-1] == self.apple:
-            self.apple = self._get_random_position()
-            self.snake_len += 1
-
-    def _check_collision_with_self(self):
-        """Helper function to check if snake has eaten itself"""
-        if self.snake_len > 1 and self.snake[-1] in self.snake[:-1]:
-            self._game_over()
-
-    def _check_out_of_bounds(self):
-        """Helper function to check if snake has moved outside the board"""
-        snake_head = self.snake[-1]
-        if snake_head[0] >= self.width or snake_head[0] < 0 or snake_head[
-            1] >= self.height or snake_head[1] < 0:
-            self._game_over()
-
-    def _check_win_condition(self):
-        """Helper function to check for win-conditions"""
-        # Check win condition
-        if 0 not in self.game_state:
-            self._game_won()
-
-    def _get_random_position(self):
-        """Helper function to generate a random, legal position"""
-        if not self.snake and not self.apple:
-            return [utils.rand_p(self.width, self.sprite_size),
-                    utils.rand_p(self.height, self.sprite_size)]
-
-        legal_positions = self._get_legal_positions()
-        pos = random.choice(legal_positions)
-        return [pos[0] * self.sprite_size,
-                pos[1] * self.sprite_size]
-
-    def _init_snake(self):
-        """Helper function to generate initial snake position"""
-        snake = []
-        for i in range(self.snake_len):
-            x = int(self.width / self.sprite_size / 2) * self.sprite_size
-            y = int(self.height / self.sprite_size / 2) * self.sprite_size
-            y += i * self.sprite_size
-            snake.append([x, y])
-        return snake
-            
-
-    def _get_legal_positions(self):
-        """Helper function to get all current legal positions"""
-        return np.array([p for p in zip(*np.where(self.game_state == 0))])
-
     def _game_over(self, msg='You Lost'):
         """Helper function to display a loss-condition message"""
+        super()._game_over(msg)
+        if self.drawn_head_seq is not None:
+            self._render()
         self._display_message(msg)
         self._exit()
 
     def _game_won(self, msg='You Won!'):
         """Helper function to display a win-condition message"""
+        super()._game_won(msg)
+        if self.drawn_head_seq is not None:
+            self._render()
         self._display_message(msg)
         self._exit()
 
@@ -311,175 +274,47 @@ class SnakeGame:
         pygame.quit()
         quit()
 
-    def _update_game_state(self):
-        """Converts the game canvas into a 2D numpy representation and
-        updates the game state
-
-        Possible game states:
-            0: Empty location
-            1: Snake body segment
-            2: Snake head segment
-            3: Apple
-        """
-        self.game_state = np.zeros((int(self.width / self.sprite_size),
-                                    int(self.height / self.sprite_size)))
-
-        if self.snake:
-            self.game_state[utils.pos_to_int(self.snake[-1], self.sprite_size)] = states['snake_head']
-            for segment in self.snake[:-1]:
-                self.game_state[utils.pos_to_int(segment, self.sprite_size)] = states['snake_body']
+    def start(self, use_ai=False, clock_speed=config.CLOCK_SPEED, render_every=1,
+              render_on_events=False):
+        """Starts the game loop
 
-        if self.apple:
-            self.game_state[utils.pos_to_int(self.apple, self.sprite_size)] = states['apple']
+        Args:
+            use_ai: Let the registered AI control the snake
+            clock_speed: Ticks per second, None or 0 to run as fast as possible
+            render_every: Draw the game every `render_every` moves
+            render_on_events: Only draw the game when the apple is eaten, and
+                when the game ends
 
-    def is_legal(self, moves):
-        """Function to check if a sequence of moves is legal / will not end
-        in a loss-condition
-
-        This function will simulate moving the snake according to the
-        provided sequence of moves.
-
-        Returns:
-            bool: True if all the moves are legal
-            bool: False if any of the moves end in a loss-condition
+        The game runs at full speed between drawn frames. With an uncapped
+        clock, events are checked every `config.EVENT_INTERVAL` seconds so
+        the game can still be quit.
         """
-        temp_snake = self.snake.copy()
-
-        if isinstance(moves, str):
-            moves = [moves]
-
-        for move in moves:
-            # Simulate move by updating temp_snake
-            temp_head = temp_snake[-1].copy()
-            temp_snake.append(temp_head)
-            if len(temp_snake) > self.snake_len:
-                del temp_snake[0]
-            
-            if move == 'up':
-                temp_head[1] += -self.sprite_size
-            elif move == 'down':
-                temp_head[1] += self.sprite_size
-            elif move == 'left':
-                temp_head[0] += -self.sprite_size
-            elif move == 'right':
-                temp_head[0] += self.sprite_size
-            else:
-                # Illegal move?
-                return False
-
-            # Out of bounds
-            if (temp_head[0] < 0 or temp_head[0] >= self.width) or \
-               (temp_head[1] < 0 or temp_head[1] >= self.height):
-                return False
-
-            # Collision with self
-            # if self.snake_len > 1 and temp_head in self.snake[:-1]:
-            if temp_head in temp_snake[:-1]:
-                return False
-
-        return True
-
-    def is_winning(self, moves):
-        """Function to check if a sequence of moves lead to the apple
-
-        NB! This function will not check for legal moves
-
-        Returns:
-            bool: True if the sequence lead to the apple
-            bool: False if the sequence does not lead to the apple
-        """
-        temp_snake = self.snake.copy()
-        temp_head = temp_snake[-1].copy()
-
-        if isinstance(moves, str):
-            moves = [moves]
-
-        for move in moves:
-            
-            if move == 'up':
-                temp_head[1] += -self.sprite_size
-            elif move == 'down':
-                temp_head[1] += self.sprite_size
-            elif move == 'left':
-                temp_head[0] += -self.sprite_size
-            elif move == 'right':
-                temp_head[0] += self.sprite_size
-            else:
-                # Illegal move?
-                return False
-
-            if temp_head[0] == self.apple[0] and temp_head[1] == self.apple[1]:
-                return True
-
-        return False
-
-    def simulate_move(self, pos, move):
-        """Simulates a move from the given position, and returns the new position"""
-        new_pos = pos.copy()
-        if move == 'up':
-            new_pos[1] += -1
-        elif move == 'down':
-            new_pos[1] += 1
-        elif move == 'left':
-            new_pos[0] += -1
-        elif move == 'right':
-            new_pos[0] += 1
-        else:
-            raise ValueError(f'Invalid Move \'{move}\'')
-        return new_pos
-
-    def get_snake_head_position(self):
-        """Returns the current position og the snake head in the game state"""
-        pos = np.where(self.game_state == states['snake_head'])
-        return list(np.hstack(pos))
-
-    def get_apple_position(self):
-        """Returns the current position of the apple in the game state"""
-        pos = np.where(self.game_state == states['apple'])
-        return list(np.hstack(pos))
-
-    def get_distance(self, p, q):
-        """Calculates distance between two points"""
-        return abs(p[0] - q[0]) + abs(p[1] - q[1])
-
-    def register_ai(self, f):
-        """Decorator for registering 'external' AI"""
-        self.ai = f
-
-    def start(self, use_ai=False):
-        #self._update_game_state()
-        self.snake = self._init_snake()
-        self._update_game_state()
-        self.apple = self._get_random_position()
+        self.reset(self.seed)
         self._update_display()
+        next_poll = 0
 
         # Game Loop
         while True:
-            for event in pygame.event.get():
-                self._check_quit_event(event)
-
-                if not use_ai:
-                    self._check_move_event(event)
-
-            if use_ai:
-                if not self.moves:
-                    self.moves = self.ai()
-                    if not self.moves:
-                        self._game_over()
-                    if isinstance(self.moves, str):  # For compatibility to older versions
-                        self.moves = [self.moves]
-                direction = self.moves.pop(0)
-                self._set_direction(direction)
-
-            if self._is_stationary():
-                self.clock.tick(config.CLOCK_SPEED)
+            if clock_speed or time.perf_counter() >= next_poll:
+                for event in pygame.event.get():
+                    self._check_quit_event(event)
+
+                    if not use_ai:
+                        self._check_move_event(event)
+                next_poll = time.perf_counter() + config.EVENT_INTERVAL
+
+            direction = self._next_move() if use_ai else None
+            if self._is_stationary() and direction is None:
+                self.clock.tick(clock_speed or config.CLOCK_SPEED)
                 continue
 
-            self._move_snake()
-            self._check_if_apple_eaten()
-            self._check_out_of_bounds()
-            self._check_collision_with_self()
-            self._check_win_condition()
+            self.step(direction)
 
-            self._update_display()
-            self.clock.tick(config.CLOCK_SPEED)
\ No newline at end of file
+            if render_on_events:
+                if self.snake_len != self.drawn_len:
+                    self._render()
+            elif self.head_seq - self.drawn_head_seq >= render_every:
+                self._render()
+
+            if clock_speed:
+                self.clock.tick(clock_speed)
@@ -0,0 +1,184 @@
+"""Runs registered snake AIs headless over many seeds in parallel
+
+An AI for the tournament is a function that takes the game engine as its
+only argument and returns a list of moves. Unlike the functions registered
+with `register_ai`, which take no arguments and reach the game through a
+closure, it is given the engine because every game is created in a worker
+process. The functions have to be defined at module level so they can be
+sent to the worker processes.
+
+A game ends with the cause 'max ticks' once the snake has gone
+`stall_factor` times the number of cells without eating an apple, so an AI
+that loops forever cannot hang the tournament.
+
+Example:
+    $ python tournament.py my_ai:super_ai --seeds 0-9999 --output results.jsonl
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from engine import SnakeEngine
+
+percentiles = (5, 25, 50, 75, 95)
+
+# Ticks allowed without eating an apple, per cell of the board. Following a
+# cycle through every cell reaches any apple within one lap.
+stall_factor = 2
+
+
+def load_ai(name):
+    """Helper function to import an AI given as 'module:function'"""
+    module_name, _, function_name = name.partition(':')
+    if not function_name:
+        raise ValueError(f'Expected AI as \'module:function\', got \'{name}\'')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def get_ai_name(ai):
+    """Helper function to get a readable name for an AI function"""
+    return f'{ai.__module__}:{ai.__qualname__}'
+
+
+def play_game(ai, seed, width=None, height=None, max_ticks=None, max_stall=None):
+    """Plays a single headless game with the given AI and seed
+
+    Args:
+        max_ticks: Optional upper limit on the number of ticks
+        max_stall: Ticks allowed without eating an apple, defaults to
+            `stall_factor` times the number of cells
+
+    Returns:
+        dict: Result of the game
+    """
+    # The global generator is seeded as well, for AIs drawing from it
+    random.seed(seed)
+    game = SnakeEngine(width, height, seed=seed)
+    game.register_ai(lambda: ai(game))
+    if max_stall is None:
+        max_stall = stall_factor * game.width * game.height
+
+    start = time.perf_counter()
+    try:
+        game.run(max_ticks=max_ticks, max_stall=max_stall)
+    except Exception as e:
+        game.cause = f'error: {e!r}'
+    wall_time = time.perf_counter() - start
+
+    return {
+        'ai': get_ai_name(ai),
+        'seed': seed,
+        'score': game.snake_len - game.start_len,
+        'length': game.snake_len,
+        'ticks': game.ticks,
+        'won': game.won,
+        'cause': game.cause,
+        'wall_time': wall_time,
+    }
+
+
+def run_tournament(ais, seeds, width=None, height=None, max_ticks=None, workers=None,
+                   max_stall=None):
+    """Plays every AI on every seed across a pool of processes
+
+    Args:
+        ais: List of AI functions
+        seeds: List of seeds, every AI plays one game per seed
+        width, height: Board size in cells, defaults to the config
+        max_ticks: Optional upper limit on the number of ticks per game
+        max_stall: Ticks allowed without eating an apple, defaults to
+            `stall_factor` times the number of cells
+        workers: Number of processes, defaults to the number of cores
+
+    Yields:
+        dict: Result of each game, in the order the games finish
+    """
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(play_game, ai, seed, width, height, max_ticks, max_stall)
+                   for ai in ais for seed in seeds]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summarize(results):
+    """Aggregates game results into percentiles per AI
+
+    Returns:
+        dict: For each AI, the number of games, wins, causes of death and
+            percentiles of score, length, ticks and wall time
+    """
+    grouped = {}
+    for result in results:
+        grouped.setdefault(result['ai'], []).append(result)
+
+    summary = {}
+    for ai, games in grouped.items():
+        causes = {}
+        for game in games:
+            causes[game['cause']] = causes.get(game['cause'], 0) + 1
+
+        summary[ai] = {
+            'games': len(games),
+            'wins': sum(game['won'] for game in games),
+            'causes': causes,
+        }
+        for key in ('score', 'length', 'ticks', 'wall_time'):
+            values = np.percentile([game[key] for game in games], percentiles)
+            summary[ai][key] = {f'p{p}': float(v) for p, v in zip(percentiles, values)}
+    return summary
+
+
+def parse_seeds(text):
+    """Helper function to parse seeds like '0-999' or '1,5,7'"""
+    seeds = []
+    for part in text.split(','):
+        start, _, end = part.partition('-')
+        if end:
+            seeds.extend(range(int(start), int(end) + 1))
+        else:
+            seeds.append(int(start))
+    return seeds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run snake AIs over many seeds')
+    parser.add_argument('ais', nargs='+', help='AI functions given as module:function')
+    parser.add_argument('--seeds', default='0-99', help='Seeds like 0-999 or 1,5,7')
+    parser.add_argument('--width', type=int, default=None, help='Board width in cells')
+    parser.add_argument('--height', type=int, default=None, help='Board height in cells')
+    parser.add_argument('--max-ticks', type=int, default=None, help='Tick limit per game')
+    parser.add_argument('--max-stall', type=int, default=None,
+                        help='Tick limit without eating an apple, defaults to '
+                             f'{stall_factor} times the number of cells')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes')
+    parser.add_argument('--output', default=None, help='File to stream results to as JSON lines')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    ais = [load_ai(name) for name in args.ais]
+    seeds = parse_seeds(args.seeds)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    results = []
+    try:
+        for result in run_tournament(ais, seeds, args.width, args.height,
+                                     args.max_ticks, args.workers, args.max_stall):
+            results.append(result)
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(json.dumps(summarize(results), indent=4), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,13 @@ import numpy as np
 import random
 import config
 
+directions = {
+    'up': (0, -1),
+    'down': (0, 1),
+    'left': (-1, 0),
+    'right': (1, 0)
+}
+
 
 def pos_to_int(pos, sprite_size):
     """Helper function that converts position values to integer"""